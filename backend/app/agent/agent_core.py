@@ -1,82 +1,201 @@
 # app/agent/agent_core.py
+import asyncio
+import functools
+import hashlib
+import importlib.util
 import logging
+import operator
+import os
+import re
+import threading
+from collections import OrderedDict
 from typing import Optional, List, Dict, Any
 
+import httpx
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, PromptTemplate
-from langchain.agents import AgentExecutor, create_openai_functions_agent
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+from langchain_core.embeddings import Embeddings
+from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain.tools.retriever import create_retriever_tool
 from langchain_core.vectorstores import VectorStoreRetriever
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.callbacks import BaseCallbackHandler
 # Document é usado internamente pelo LangChain, não precisa ser exportado por este módulo
 # Se alguma função aqui *retornasse* um Document para main.py, aí sim main.py precisaria saber o tipo.
 
+from pydantic import BaseModel, Field
+
 from app.core.config import settings
+from app.models.pydantic_models import MatchScoreBatchResponse, MatchScoreResponse
 
 try:
     from .prompts import (
-        RECRUITMENT_AGENT_SYSTEM_PROMPT_TEMPLATE,
-        RAG_CONTEXTUALIZE_PROMPT_TEMPLATE
+        RECRUITMENT_AGENT_SYSTEM_PROMPT_WITH_CONTEXT,
+        RECRUITMENT_AGENT_SYSTEM_PROMPT_AGENT_MODE,
+        RAG_CONTEXTUALIZE_PROMPT_TEMPLATE,
+        CANDIDATES_JOB_MATCH_BATCH_PROMPT_TEMPLATE
     )
     logger.info("Módulo prompts.py carregado.")
 except ImportError as e:
     logger.warning(f"Módulo prompts.py não encontrado ou erro: {e}. Usando fallbacks.")
-    RECRUITMENT_AGENT_SYSTEM_PROMPT_TEMPLATE = """Você é o IntelligentMatch AI. Contexto: {context}. Responda em Português."""
+    RECRUITMENT_AGENT_SYSTEM_PROMPT_AGENT_MODE = """Você é o IntelligentMatch AI. Responda em Português."""
+    RECRUITMENT_AGENT_SYSTEM_PROMPT_WITH_CONTEXT = """Você é o IntelligentMatch AI. Contexto: {context}. Responda em Português."""
     RAG_CONTEXTUALIZE_PROMPT_TEMPLATE = """Histórico: {chat_history}\nPergunta: {question}\nPergunta Independente:"""
+    CANDIDATES_JOB_MATCH_BATCH_PROMPT_TEMPLATE = """Pontue de 0 a 100 o match de cada candidato com a vaga {job_id}, com justificativa.\nVaga: {job_description}\nCandidatos:\n{candidates}"""
+
+# Templates compilados uma única vez na carga do módulo (evita reconstruí-los a cada create_*).
+# O system prompt do agente fica estático e como primeira mensagem: é o prefixo reaproveitado pelo prompt caching da OpenAI.
+_CONTEXTUALIZE_PROMPT = PromptTemplate.from_template(RAG_CONTEXTUALIZE_PROMPT_TEMPLATE)
+_QA_PROMPT = ChatPromptTemplate.from_messages([("system", RECRUITMENT_AGENT_SYSTEM_PROMPT_WITH_CONTEXT), ("human", "{question}")])
+
+# Pronomes/anáforas que indicam dependência do histórico; sem eles a pergunta já é independente e não precisa ser reescrita
+_ANAPHORA_RE = re.compile(r"\b(d?[en]?el[ea]s?|isso|disso|nisso|[dn]?aquel[ea]s?|[dn]?ess[ea]s?|[dn]?est[ea]s?)\b", re.IGNORECASE)
+
+# Prefixo por classe de mensagem para serializar o histórico (lookup único por mensagem)
+_DOC_SEP = "\n\n"
+_PAGE_CONTENT = operator.attrgetter("page_content")
+_HISTORY_PREFIX = {HumanMessage: "Humano: ", AIMessage: "IA: "}
+
+@functools.lru_cache(maxsize=8)
+def _get_agent_prompt(system_prompt_str: str) -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages([("system", system_prompt_str + "\nResponda SEMPRE em Português do Brasil."), MessagesPlaceholder(variable_name="chat_history", optional=True), ("human", "{input}"), MessagesPlaceholder(variable_name="agent_scratchpad"),])
+
+class ConcurrentOpenAIEmbeddings(OpenAIEmbeddings):
+    """OpenAIEmbeddings que dispara os lotes assíncronos em paralelo (asyncio.gather), limitado por semáforo para respeitar o TPM."""
+    max_concurrent_batches: int = 5
+
+    async def aembed_documents(self, texts: List[str], chunk_size: Optional[int] = None, **kwargs: Any) -> List[List[float]]:
+        batch_size = chunk_size or self.chunk_size
+        embed_batch_serial = super().aembed_documents # API pública: tokenização, chunking e textos vazios ficam com o langchain-openai
+        if len(texts) <= batch_size: return await embed_batch_serial(texts, chunk_size=batch_size, **kwargs)
+        semaphore = asyncio.Semaphore(self.max_concurrent_batches)
+        async def embed_batch(start: int) -> List[List[float]]:
+            async with semaphore: return await embed_batch_serial(texts[start : start + batch_size], chunk_size=batch_size, **kwargs)
+        # gather preserva a ordem dos lotes, então a remontagem segue a ordem de entrada
+        batches = await asyncio.gather(*(embed_batch(i) for i in range(0, len(texts), batch_size)))
+        return [emb for batch in batches for emb in batch]
+
+class EmbeddingCacheWrapper(Embeddings):
+    """Embeddings com LRU em memória para embed_query (chave: SHA-256 da pergunta normalizada); o resto é delegado."""
+    def __init__(self, underlying: Embeddings, maxsize: int = 2048):
+        self.underlying = underlying
+        self.maxsize = maxsize
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(text: str) -> str: return hashlib.sha256(text.strip().lower().encode()).hexdigest()
+
+    def _get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None: self._cache.move_to_end(key)
+            return vector
+
+    def _put(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._cache[key] = vector; self._cache.move_to_end(key)
+            if len(self._cache) > self.maxsize: self._cache.popitem(last=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self._get(key)
+        if vector is None: vector = self.underlying.embed_query(text); self._put(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self._get(key)
+        if vector is None: vector = await self.underlying.aembed_query(text); self._put(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]: return self.underlying.embed_documents(texts)
 
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]: return await self.underlying.aembed_documents(texts)
+
+# Pool HTTP único para LLM e embeddings: reaproveita conexões keep-alive com api.openai.com entre sessões
+# (sem handshake TLS por requisição). HTTP/2 só é ativado se o pacote h2 (httpx[http2]) estiver instalado.
+_HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+_HTTP2 = importlib.util.find_spec("h2") is not None
+_SHARED_HTTP_CLIENT = httpx.Client(limits=_HTTP_LIMITS, timeout=60.0, http2=_HTTP2)
+_SHARED_ASYNC_HTTP_CLIENT = httpx.AsyncClient(limits=_HTTP_LIMITS, timeout=60.0, http2=_HTTP2)
+
+# Singletons com double-checked locking: o caminho quente é só a leitura do global, sem lock nem log por chamada.
+# O lock (um por singleton, para LLM e embeddings inicializarem em paralelo no lifespan) só é tomado
+# enquanto a instância ainda não existe, garantindo que inicializações concorrentes não construam dois clientes.
+_llm_init_lock = threading.Lock(); _embeddings_init_lock = threading.Lock()
 _llm_instance: Optional[ChatOpenAI] = None
-_embeddings_instance: Optional[OpenAIEmbeddings] = None
+_embeddings_instance: Optional[Embeddings] = None
+
+def _build_llm(api_key_to_use: Optional[str], model_to_use: str) -> ChatOpenAI:
+    logger.debug(f"GET_LLM: Tentando inicializar LLM '{model_to_use}'. Chave API (de settings): {'Presente' if api_key_to_use else 'AUSENTE'}")
+    if not api_key_to_use:
+        logger.error("ERRO FATAL em get_llm: settings.OPENAI_API_KEY é None ou vazia!"); raise ValueError("OPENAI_API_KEY não configurada.")
+    try:
+        llm_instance = ChatOpenAI(temperature=0.1, model_name=model_to_use, openai_api_key=api_key_to_use, max_tokens=1500, streaming=True, model_kwargs={"prompt_cache_key": settings.LLM_PROMPT_CACHE_KEY}, http_client=_SHARED_HTTP_CLIENT, http_async_client=_SHARED_ASYNC_HTTP_CLIENT)
+        logger.info(f"LLM ({model_to_use}) instanciado.")
+        return llm_instance
+    except Exception as e:
+        logger.error(f"Falha ao instanciar LLM ({model_to_use}): {e}", exc_info=True); raise ValueError(f"Não foi possível inicializar LLM: {e}")
+
+def _build_embeddings(api_key_to_use: Optional[str], model_to_use: str, dimensions: Optional[int]) -> Embeddings:
+    logger.debug(f"GET_EMBEDDINGS: Tentando inicializar Embeddings '{model_to_use}'. Chave API (de settings): {'Presente' if api_key_to_use else 'AUSENTE'}")
+    if not api_key_to_use:
+        logger.error("ERRO FATAL em get_embeddings: settings.OPENAI_API_KEY é None ou vazia!"); raise ValueError("OPENAI_API_KEY não configurada.")
+    try:
+        underlying_embeddings = ConcurrentOpenAIEmbeddings(openai_api_key=api_key_to_use, model=model_to_use, dimensions=dimensions, http_client=_SHARED_HTTP_CLIENT, http_async_client=_SHARED_ASYNC_HTTP_CLIENT)
+        # Cache exato (SHA-256 do texto) persistido junto ao ChromaDB: evita re-embeddar docs e perguntas repetidas
+        cache_path = os.path.join(settings.CHROMA_DB_PATH, "embcache")
+        embeddings_instance = CacheBackedEmbeddings.from_bytes_store(underlying_embeddings, LocalFileStore(cache_path), namespace=f"{model_to_use}-{dimensions}" if dimensions else model_to_use, query_embedding_cache=True, key_encoder="sha256")
+        logger.info(f"Embeddings ({model_to_use}, {dimensions or 'nativa'} dims) inicializados com cache em {cache_path}.")
+        # LRU em memória na frente do cache em disco: perguntas repetidas não tocam nem o LocalFileStore
+        return EmbeddingCacheWrapper(embeddings_instance)
+    except Exception as e:
+        logger.error(f"Falha ao instanciar Embeddings ({model_to_use}): {e}", exc_info=True); raise ValueError(f"Não foi possível inicializar Embeddings: {e}")
 
 def get_llm() -> ChatOpenAI:
     global _llm_instance
     if _llm_instance is None:
-        api_key_to_use = settings.OPENAI_API_KEY
-        model_to_use = settings.LLM_MODEL_NAME
-        logger.info(f"GET_LLM: Tentando inicializar LLM '{model_to_use}'. Chave API (de settings): {'Presente' if api_key_to_use else 'AUSENTE'}")
-        if not api_key_to_use:
-            logger.error("ERRO FATAL em get_llm: settings.OPENAI_API_KEY é None ou vazia!"); raise ValueError("OPENAI_API_KEY não configurada.")
-        try:
-            _llm_instance = ChatOpenAI(temperature=0.1, model_name=model_to_use, openai_api_key=api_key_to_use, max_tokens=1500)
-            logger.info(f"LLM ({model_to_use}) instanciado.")
-        except Exception as e:
-            logger.error(f"Falha ao instanciar LLM ({model_to_use}): {e}", exc_info=True); raise ValueError(f"Não foi possível inicializar LLM: {e}")
+        with _llm_init_lock:
+            if _llm_instance is None: _llm_instance = _build_llm(settings.OPENAI_API_KEY, settings.LLM_MODEL_NAME)
     return _llm_instance
 
-def get_embeddings() -> OpenAIEmbeddings:
+def get_embeddings() -> Embeddings:
     global _embeddings_instance
     if _embeddings_instance is None:
-        api_key_to_use = settings.OPENAI_API_KEY
-        model_to_use = settings.EMBEDDING_MODEL_NAME
-        logger.info(f"GET_EMBEDDINGS: Tentando inicializar Embeddings '{model_to_use}'. Chave API (de settings): {'Presente' if api_key_to_use else 'AUSENTE'}")
-        if not api_key_to_use:
-            logger.error("ERRO FATAL em get_embeddings: settings.OPENAI_API_KEY é None ou vazia!"); raise ValueError("OPENAI_API_KEY não configurada.")
-        try:
-            _embeddings_instance = OpenAIEmbeddings(openai_api_key=api_key_to_use, model=model_to_use)
-            logger.info(f"Embeddings ({model_to_use}) inicializados.")
-        except Exception as e:
-            logger.error(f"Falha ao instanciar Embeddings ({model_to_use}): {e}", exc_info=True); raise ValueError(f"Não foi possível inicializar Embeddings: {e}")
+        with _embeddings_init_lock:
+            if _embeddings_instance is None: _embeddings_instance = _build_embeddings(settings.OPENAI_API_KEY, settings.EMBEDDING_MODEL_NAME, settings.EMBEDDING_DIMENSIONS)
     return _embeddings_instance
 
+class AgentDebugLogHandler(BaseCallbackHandler):
+    """Registra em DEBUG apenas as saídas de ferramentas e a resposta final do agente (substitui verbose=True)."""
+    def on_tool_end(self, output: Any, **kwargs: Any) -> None:
+        if logger.isEnabledFor(logging.DEBUG): logger.debug(f"Agente - saída de ferramenta: {str(output)[:500]}")
+    def on_agent_finish(self, finish: Any, **kwargs: Any) -> None:
+        if logger.isEnabledFor(logging.DEBUG): logger.debug(f"Agente - resposta final: {str(finish.return_values.get('output', ''))[:500]}")
+
+_AGENT_DEBUG_LOG_HANDLER = AgentDebugLogHandler()
+
 def create_simple_rag_chain(llm: ChatOpenAI, retriever: VectorStoreRetriever):
     logger.info("Criando RAG chain simples...")
-    contextualize_q_prompt = PromptTemplate.from_template(RAG_CONTEXTUALIZE_PROMPT_TEMPLATE)
-    contextualize_q_chain = contextualize_q_prompt | llm | StrOutputParser()
-    qa_system_prompt = RECRUITMENT_AGENT_SYSTEM_PROMPT_TEMPLATE
-    qa_prompt = ChatPromptTemplate.from_messages([("system", qa_system_prompt), ("human", "{question}")])
-    def format_docs(docs: List[Any]) -> str: return "\n\n".join(doc.page_content for doc in docs if hasattr(doc, 'page_content'))
+    contextualize_q_chain = _CONTEXTUALIZE_PROMPT | llm | StrOutputParser()
+    def format_docs(docs: List[Any]) -> str: return _DOC_SEP.join(map(_PAGE_CONTENT, docs))  # retriever do Chroma sempre devolve Document
     def contextualized_retriever_input(input_data: Dict) -> str:
-        chat_history_str = ""
-        if "chat_history" in input_data and input_data["chat_history"]:
-            for msg in input_data["chat_history"]:
-                if isinstance(msg, HumanMessage): chat_history_str += f"Humano: {msg.content}\n"
-                elif isinstance(msg, AIMessage): chat_history_str += f"IA: {msg.content}\n"
-            if chat_history_str: return contextualize_q_chain.invoke({"chat_history": chat_history_str.strip(), "question": input_data["question"]})
+        chat_history = input_data.get("chat_history")
+        # Sem histórico relevante ou sem anáfora na pergunta: pula a chamada ao LLM de reformulação
+        if chat_history and len(chat_history) > 1 and _ANAPHORA_RE.search(input_data["question"]):
+            parts = [f"{_HISTORY_PREFIX[type(msg)]}{msg.content}" for msg in chat_history if type(msg) in _HISTORY_PREFIX]
+            if parts: return contextualize_q_chain.invoke({"chat_history": "\n".join(parts).strip(), "question": input_data["question"]})
         return input_data["question"]
-    rag_chain = (RunnablePassthrough.assign(context=(lambda input_data: contextualized_retriever_input(input_data)) | retriever | format_docs) | qa_prompt | llm | StrOutputParser())
+    rag_chain = (RunnablePassthrough.assign(context=(lambda input_data: contextualized_retriever_input(input_data)) | retriever | format_docs) | _QA_PROMPT | llm | StrOutputParser())
     logger.info("RAG chain simples criado.")
     return rag_chain
 
@@ -92,14 +211,49 @@ def create_recruitment_agent_executor(llm: ChatOpenAI, vector_store_retriever: O
         except Exception as e: logger.error(f"Falha ao criar retriever_tool: {e}", exc_info=True)
     else: logger.warning("Vector store retriever não fornecido. 'knowledge_base_search' não criada.")
     if not tools: logger.warning("Nenhuma ferramenta configurada. Agente limitado.")
-    agent_prompt_template_str = RECRUITMENT_AGENT_SYSTEM_PROMPT_TEMPLATE.replace("\nContexto relevante de documentos recuperados (este placeholder é usado por chains RAG específicas, não diretamente pelo system prompt do agente principal se ele usa ferramentas para buscar contexto):\n{context}", "").replace("\nContexto: {context}", "")
-    prompt = ChatPromptTemplate.from_messages([("system", agent_prompt_template_str + "\nResponda SEMPRE em Português do Brasil."), MessagesPlaceholder(variable_name="chat_history", optional=True), ("human", "{input}"), MessagesPlaceholder(variable_name="agent_scratchpad"),])
+    # Callbacks do construtor do AgentExecutor não são herdados pelas ferramentas: o handler é anexado a cada uma
+    for tool in tools: tool.callbacks = [_AGENT_DEBUG_LOG_HANDLER]
+    prompt = _get_agent_prompt(RECRUITMENT_AGENT_SYSTEM_PROMPT_AGENT_MODE)
     try:
         logger.info(f"Criando agente com {len(tools)} ferramentas.")
-        agent = create_openai_functions_agent(llm, tools, prompt)
-        logger.info("Agente (OpenAI Functions) criado.")
-    except Exception as e: logger.error(f"Erro ao criar OpenAI Functions Agent: {e}", exc_info=True); return None
+        # Tools agent: o modelo pode emitir vários tool_calls por mensagem e o AgentExecutor
+        # os executa concorrentemente (asyncio.gather) no caminho ainvoke
+        agent = create_openai_tools_agent(llm, tools, prompt)
+        logger.info("Agente (OpenAI Tools) criado.")
+    except Exception as e: logger.error(f"Erro ao criar OpenAI Tools Agent: {e}", exc_info=True); return None
     try:
-        agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True, handle_parsing_errors="Check e repasse o erro para o usuário de forma amigável.", max_iterations=7, return_intermediate_steps=True)
+        agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=False, callbacks=[_AGENT_DEBUG_LOG_HANDLER], handle_parsing_errors="Check e repasse o erro para o usuário de forma amigável.", max_iterations=7, return_intermediate_steps=True)
         logger.info("AgentExecutor criado."); return agent_executor
-    except Exception as e: logger.error(f"Erro ao criar AgentExecutor: {e}", exc_info=True); return None
\ No newline at end of file
+    except Exception as e: logger.error(f"Erro ao criar AgentExecutor: {e}", exc_info=True); return None
+
+_MATCH_BATCH_PROMPT = ChatPromptTemplate.from_template(CANDIDATES_JOB_MATCH_BATCH_PROMPT_TEMPLATE)
+# Limite de caracteres por texto no prompt de match em lote: mantém a chamada única dentro de um tamanho previsível
+_MATCH_TEXT_MAX_CHARS = 4000
+
+# Schema da saída estruturada do LLM: sem job_id (preenchido no servidor), para uma vaga omitida pelo modelo não derrubar a resposta
+class _MatchScoreLLMItem(BaseModel):
+    applicant_id: str = Field(..., description="ID do candidato avaliado, exatamente como informado.")
+    score: int = Field(..., ge=0, le=100, description="Pontuação de match de 0 a 100.")
+    justification: str = Field(..., description="Justificativa para a pontuação de match.")
+
+class _MatchScoreLLMOutput(BaseModel):
+    results: List[_MatchScoreLLMItem] = Field(default_factory=list, description="Uma avaliação por candidato.")
+
+async def ascore_applicants_for_job(llm: ChatOpenAI, embeddings: Embeddings, job_id: str, job_text: str, applicants: Dict[str, str], top_k: int) -> MatchScoreBatchResponse:
+    """Pré-ranqueia os candidatos por similaridade de cosseno com a vaga e avalia os top_k em uma única chamada ao LLM."""
+    applicant_ids = list(applicants)
+    # Uma chamada em lote; textos já indexados saem do cache de embeddings (CacheBackedEmbeddings) sem ir à API
+    vectors = np.asarray(await embeddings.aembed_documents([job_text, *applicants.values()]), dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarities = vectors[1:] @ vectors[0]
+    top_idx = np.argsort(-similarities)[:top_k]
+    candidates_block = "\n\n".join(f"### Candidato ID {applicant_ids[i]} (similaridade semântica: {similarities[i]:.2f})\n{applicants[applicant_ids[i]][:_MATCH_TEXT_MAX_CHARS]}" for i in top_idx)
+    chain = _MATCH_BATCH_PROMPT | llm.with_structured_output(_MatchScoreLLMOutput)
+    response = await chain.ainvoke({"job_id": job_id, "job_description": job_text[:_MATCH_TEXT_MAX_CHARS], "candidates": candidates_block})
+    # Descarta IDs que o LLM não recebeu (ou repetiu) e ordena pela pontuação
+    expected_ids = {applicant_ids[i] for i in top_idx}; results = []
+    for result in response.results:
+        if result.applicant_id in expected_ids: expected_ids.discard(result.applicant_id); results.append(MatchScoreResponse(job_id=job_id, **result.model_dump()))
+    results.sort(key=operator.attrgetter("score"), reverse=True)
+    logger.info(f"Match em lote para vaga {job_id}: {len(applicant_ids)} candidatos pré-ranqueados, {len(results)} avaliados pelo LLM.")
+    return MatchScoreBatchResponse(job_id=job_id, results=results)
@@ -1,7 +1,7 @@
 # app/agent/prompts.py
 
-# Template principal do sistema para o agente de recrutamento
-RECRUITMENT_AGENT_SYSTEM_PROMPT_TEMPLATE = """Você é o IntelligentMatch AI, um assistente de recrutamento inteligente, profissional e amigável. Sua principal função é ajudar recrutadores a:
+# Template principal do sistema para o agente de recrutamento (modo agente: o contexto vem das ferramentas)
+RECRUITMENT_AGENT_SYSTEM_PROMPT_AGENT_MODE = """Você é o IntelligentMatch AI, um assistente de recrutamento inteligente, profissional e amigável. Sua principal função é ajudar recrutadores a:
 1.  Analisar descrições de vagas para extrair requisitos chave.
 2.  Analisar CVs de candidatos para extrair suas qualificações, experiências e habilidades.
 3.  Comparar candidatos com vagas para determinar o "match" ou adequação.
@@ -15,10 +15,14 @@ Instruções Gerais:
 - Ao usar informações da base de conhecimento, você pode mencionar brevemente a fonte (ex: "De acordo com a descrição da vaga..." ou "O CV do candidato X indica...").
 - Formate respostas mais longas ou listas de forma clara e legível, usando markdown se apropriado.
 - Se uma pergunta for ambígua, peça esclarecimentos.
+"""
 
+# Mesmo texto com o bloco {context}, usado pelas chains RAG que injetam os documentos recuperados
+RECRUITMENT_AGENT_SYSTEM_PROMPT_WITH_CONTEXT = RECRUITMENT_AGENT_SYSTEM_PROMPT_AGENT_MODE + """
 Contexto relevante de documentos recuperados (este placeholder é usado por chains RAG específicas, não diretamente pelo system prompt do agente principal se ele usa ferramentas para buscar contexto):
 {context}
 """
+RECRUITMENT_AGENT_SYSTEM_PROMPT_TEMPLATE = RECRUITMENT_AGENT_SYSTEM_PROMPT_WITH_CONTEXT
 
 # Template para contextualizar uma pergunta de acompanhamento usando o histórico do chat
 RAG_CONTEXTUALIZE_PROMPT_TEMPLATE = """Dada a conversa anterior e a nova pergunta do usuário, reformule a nova pergunta para ser uma pergunta independente que possa ser entendida sem a conversa anterior.
@@ -83,4 +87,18 @@ Resumo do Perfil do Candidato (CV):
 {candidate_cv_summary}
 
 Avaliação do "Match" (Objeto JSON):
-"""
\ No newline at end of file
+"""
+
+# Avaliação em lote: vários candidatos contra a mesma vaga em uma única chamada ao LLM (saída estruturada)
+CANDIDATES_JOB_MATCH_BATCH_PROMPT_TEMPLATE = """Avalie o "match" (adequação) de cada candidato abaixo com a vaga descrita.
+Considere as habilidades técnicas, anos de experiência, nível de senioridade, formação acadêmica, certificações e conhecimentos linguísticos.
+Para CADA candidato, forneça uma pontuação de "match" de 0 a 100 (onde 100 é um "match" perfeito e 0 é nenhum "match") e um breve resumo (2-4 frases) justificando sua avaliação, destacando os pontos fortes e fracos do candidato em relação à vaga.
+A similaridade semântica informada é apenas um indicativo inicial; baseie a pontuação no conteúdo.
+Use exatamente os IDs de candidato informados.
+
+Vaga (ID {job_id}):
+{job_description}
+
+Candidatos:
+{candidates}
+"""
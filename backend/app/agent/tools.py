@@ -1,29 +1,63 @@
 # app/agent/tools.py
 from langchain.tools import BaseTool, Tool
-from langchain.pydantic_v1 import BaseModel, Field # BaseModel and Field are from pydantic_v1 for Langchain
-from typing import Type, Optional, List, Dict, Any
-from app.agent.agent_core import get_rag_chain, get_vector_store # RAG_PROMPT removed as it's not directly used here, assumed to be used within get_rag_chain
-from app.core.config import get_llm
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
-from app.agent.prompts import CANDIDATE_MATCHER_LLM_PROMPT
+from pydantic import BaseModel, Field # Pydantic v2: langchain-core 0.3 valida args_schema nativamente (validador compilado na definição da classe)
+from typing import Type, Optional, List, Dict, Any, Tuple, Union
+import asyncio
+import functools
+import threading
+import orjson
+from app.agent.agent_core import create_simple_rag_chain, get_embeddings, get_llm
+from app.data_processing.loader_complete import get_vector_store
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from app.agent.prompts import CANDIDATES_JOB_MATCH_BATCH_PROMPT_TEMPLATE
 # from app.data_processing.loader import _textualize_vacancy, _textualize_applicant # Not used directly in this version, can be removed if not needed for other parts
 
-# Initialize the retriever globalmente ou passa como argumento para as ferramentas
-_vector_store = None
-_retriever = None
-_rag_chain = None
-
-try:
-    _vector_store = get_vector_store() # Tenta carregar ou criar
-    if _vector_store: # Ensure vector_store was loaded before creating retriever
-        _retriever = _vector_store.as_retriever(search_kwargs={"k": 5})
-        _rag_chain = get_rag_chain(_retriever) # Pass the actual retriever object
-    else:
-        print("AVISO: Vector Store não pôde ser inicializado. RAG chain não disponível.")
-except Exception as e:
-    print(f"AVISO: Falha ao inicializar o RAG chain para as ferramentas: {e}")
-    # _rag_chain remains None, which is handled in the tools
+# Vector store, retriever e RAG chain são inicializados sob demanda (primeira chamada de uma ferramenta),
+# para não abrir o ChromaDB nem criar clientes OpenAI durante o import/startup do uvicorn.
+_rag_lock = threading.Lock()
+_rag_components: Optional[Tuple[Any, Any, Any]] = None
+
+def _get_rag() -> Tuple[Any, Any, Any]:
+    global _rag_components
+    if _rag_components is None:
+        with _rag_lock:
+            if _rag_components is None:
+                try:
+                    vector_store = get_vector_store() # Tenta carregar ou criar
+                    if vector_store: # Ensure vector_store was loaded before creating retriever
+                        retriever = vector_store.as_retriever(search_kwargs={"k": 5})
+                        _rag_components = (vector_store, retriever, create_simple_rag_chain(get_llm(), retriever))
+                    else:
+                        print("AVISO: Vector Store não pôde ser inicializado. RAG chain não disponível.")
+                except Exception as e:
+                    print(f"AVISO: Falha ao inicializar o RAG chain para as ferramentas: {e}")
+                    # Falhas não são cacheadas: a próxima chamada tenta novamente
+    return _rag_components or (None, None, None)
+
+# Prompt e chain do matcher são imutáveis: construídos uma vez, não a cada _run
+# Mesmo prompt de avaliação em lote do /match_score/batch (vaga + bloco de candidatos), aqui com saída em texto
+_MATCHER_PROMPT = PromptTemplate(template=CANDIDATES_JOB_MATCH_BATCH_PROMPT_TEMPLATE, input_variables=["job_id", "job_description", "candidates"])
+
+# Candidatos por chamada ao matcher (4-8 é o ponto de equilíbrio entre tamanho do prompt e nº de chamadas)
+MATCHER_ROW_BATCH = 4
+
+@functools.lru_cache(maxsize=1)
+def _matcher_chain():
+    return _MATCHER_PROMPT | get_llm() | StrOutputParser()
+
+def _join_matcher_responses(responses: List[str]) -> str:
+    texts = [response or "Não foi possível gerar a avaliação de compatibilidade." for response in responses]
+    try:
+        parsed = [orjson.loads(text) for text in texts]
+    except orjson.JSONDecodeError:
+        return "\n\n".join(texts) # Resposta não veio em JSON puro: devolve o texto dos lotes como está
+    if len(parsed) == 1: return orjson.dumps(parsed[0]).decode()
+    # Une os resultados JSON dos lotes em uma única lista
+    return orjson.dumps([item for result in parsed for item in (result if isinstance(result, list) else [result])]).decode()
+
+def _candidates_query(vacancy_description: str) -> str:
+    return f"Candidatos adequados para a vaga: {vacancy_description}"
 
 class RecruitmentDataQueryInput(BaseModel):
     query: str = Field(description="A pergunta específica sobre candidatos, prospects ou vagas.")
@@ -38,23 +72,21 @@ class RecruitmentDataQueryTool(BaseTool):
     args_schema: Type[BaseModel] = RecruitmentDataQueryInput # Corrected: Type annotation for args_schema
 
     def _run(self, query: str) -> str:
-        if not _rag_chain:
+        _, _, rag_chain = _get_rag()
+        if not rag_chain:
             return "Erro: A cadeia de consulta de dados de recrutamento não está disponível."
         try:
-            response = _rag_chain.invoke({"query": query}) # 'query' is the expected input key for the RAG chain from RAG_PROMPT
-            # Assuming the RAG chain output dictionary has a key like 'answer' or 'result'
-            # Adjust .get("answer", ...) if your RAG chain returns a different key for the main response.
-            return response.get("answer", response.get("result", "Não foi possível processar a consulta ou a chave de resposta não foi encontrada."))
+            # create_simple_rag_chain recebe {"question": ...} e devolve a resposta já como string
+            return rag_chain.invoke({"question": query}) or "Não foi possível processar a consulta."
         except Exception as e:
             return f"Erro ao processar a consulta com RAG: {e}"
 
     async def _arun(self, query: str) -> str:
-        if not _rag_chain:
+        _, _, rag_chain = _get_rag()
+        if not rag_chain:
             return "Erro: A cadeia de consulta de dados de recrutamento não está disponível."
         try:
-            # Ensure your _rag_chain supports ainvoke and the input schema is correct
-            response = await _rag_chain.ainvoke({"query": query})
-            return response.get("answer", response.get("result", "Não foi possível processar a consulta assíncrona ou a chave de resposta não foi encontrada."))
+            return await rag_chain.ainvoke({"question": query}) or "Não foi possível processar a consulta assíncrona."
         except Exception as e:
             return f"Erro ao processar a consulta assíncrona com RAG: {e}"
 
@@ -71,62 +103,39 @@ class CandidateMatcherTool(BaseTool):
     )
     args_schema: Type[BaseModel] = CandidateMatcherInput # Corrected: Type annotation for args_schema
 
-    def _get_vacancy_details(self, vacancy_id_or_description: str) -> Optional[Dict[str, Any]]: # Corrected type hint
-        if not _vector_store:
-            print("AVISO: Vector Store não disponível em _get_vacancy_details.")
-            return None
-
-        # Tenta buscar a vaga pelo ID primeiro
-        # Assuming IDs are unique and well-defined.
-        # A direct lookup might be more efficient if your vector store or another DB supports it for IDs.
-        # For similarity search on ID, it's a bit of a workaround.
+    def _get_vacancy_by_id(self, vector_store: Any, vacancy_id: str) -> Optional[Dict[str, Any]]:
+        # Busca exata por metadados (sem embedding): o ID não precisa passar pela API de embeddings
         try:
-            # Attempt to retrieve by a specific ID if metadata allows precise filtering
-            docs_by_id = _vector_store.similarity_search(
-                query=f"vaga com ID {vacancy_id_or_description}", # Query can be anything if filter is effective
-                filter={"type": "vacancy", "id": vacancy_id_or_description},
-                k=1
-            )
-            if docs_by_id and docs_by_id[0].metadata.get("id") == vacancy_id_or_description:
-                return {"description": docs_by_id[0].page_content, "metadata": docs_by_id[0].metadata, "id": docs_by_id[0].metadata.get("id")}
+            result = vector_store.get(where={"$and": [{"type": "vaga"}, {"codigo_vaga": vacancy_id}]}, limit=1)
+            if result and result.get("documents"):
+                metadata = (result.get("metadatas") or [{}])[0] or {}
+                return {"description": result["documents"][0], "metadata": metadata, "id": metadata.get("codigo_vaga")}
         except Exception as e:
-            print(f"Info: Não foi possível buscar vaga pelo ID '{vacancy_id_or_description}' diretamente ou ocorreu um erro: {e}. Tentando busca semântica.")
-
+            print(f"Info: Não foi possível buscar vaga pelo ID '{vacancy_id}' diretamente ou ocorreu um erro: {e}. Tentando busca semântica.")
+        return None
 
-        # Se não encontrou por ID exato ou se a busca por ID não é o método primário, trata a entrada como uma descrição
-        docs_by_description = _vector_store.similarity_search(
-            vacancy_id_or_description,
-            filter={"type": "vacancy"}, # General filter for vacancies
-            k=1
-        )
+    def _get_vacancy_details(self, vector_store: Any, query_embedding: List[float]) -> Optional[Dict[str, Any]]:
+        # Trata a entrada como uma descrição, reaproveitando o embedding já calculado
+        docs_by_description = vector_store.similarity_search_by_vector(query_embedding, k=1, filter={"type": "vaga"})
         if docs_by_description:
-            return {"description": docs_by_description[0].page_content, "metadata": docs_by_description[0].metadata, "id": docs_by_description[0].metadata.get("id")}
+            return {"description": docs_by_description[0].page_content, "metadata": docs_by_description[0].metadata, "id": docs_by_description[0].metadata.get("codigo_vaga")}
         return None
 
-    def _find_candidate_profiles(self, vacancy_description: str, num_candidates: int = 5) -> List[Dict[str, Any]]: # Corrected type hint
-        if not _vector_store:
-            print("AVISO: Vector Store não disponível em _find_candidate_profiles.")
-            return []
-
-        candidate_docs = _vector_store.similarity_search(
-            query=f"Candidatos adequados para a vaga: {vacancy_description}",
+    def _find_candidate_profiles(self, vector_store: Any, query_embedding: List[float], num_candidates: int = 5) -> List[Dict[str, Any]]:
+        candidate_docs = vector_store.similarity_search_by_vector(
+            query_embedding,
             k=num_candidates,
-            filter={"type": "applicant"} # Busca apenas em candidatos
+            filter={"type": "candidato"} # Busca apenas em candidatos (valores de "type" gravados pelo loader)
         )
-        return [{"profile_text": doc.page_content, "metadata": doc.metadata, "id": doc.metadata.get("id")} for doc in candidate_docs]
+        return [{"profile_text": doc.page_content, "metadata": doc.metadata, "id": doc.metadata.get("codigo_profissional")} for doc in candidate_docs]
 
-    def _run(self, vacancy_id_or_description: str) -> str:
-        if not _vector_store:
-            return "Erro: Vector Store não disponível para correspondência de candidatos."
-
-        vacancy_info = self._get_vacancy_details(vacancy_id_or_description)
+    def _build_matcher_inputs(self, vacancy_id_or_description: str, vacancy_info: Optional[Dict[str, Any]], candidate_profiles_data: List[Dict[str, Any]]) -> Union[str, List[Dict[str, str]]]:
+        # Retorna os inputs do matcher ou, se faltar vaga/candidatos, a mensagem a ser devolvida pela ferramenta
         if not vacancy_info:
             return f"Vaga com ID ou descrição '{vacancy_id_or_description}' não encontrada."
 
         vacancy_description_text = vacancy_info["description"]
         vacancy_id = vacancy_info.get("id", "ID Desconhecido") # Get ID for context
-
-        candidate_profiles_data = self._find_candidate_profiles(vacancy_description_text)
         if not candidate_profiles_data:
             return f"Nenhum candidato encontrado para a vaga: {vacancy_id} ({vacancy_description_text[:100]}...)."
 
@@ -137,34 +146,58 @@ class CandidateMatcherTool(BaseTool):
             profile_text = cand.get("profile_text", "Perfil não disponível")
             candidate_profiles_for_prompt.append(f"ID Candidato: {cand_id}\nPerfil:\n{profile_text}")
 
-        candidate_profiles_text = "\n\n---\n\n".join(candidate_profiles_for_prompt)
-
+        # Um input por lote de até MATCHER_ROW_BATCH candidatos: limita o tamanho do prompt
+        # e permite avaliar os lotes em paralelo
+        return [
+            {"job_id": vacancy_id, "job_description": vacancy_description_text, "candidates": "\n\n---\n\n".join(candidate_profiles_for_prompt[i : i + MATCHER_ROW_BATCH])}
+            for i in range(0, len(candidate_profiles_for_prompt), MATCHER_ROW_BATCH)
+        ]
 
-        llm = get_llm()
-        # Ensure CANDIDATE_MATCHER_LLM_PROMPT expects "vacancy_description" and "candidate_profiles"
-        prompt_template = PromptTemplate(
-            template=CANDIDATE_MATCHER_LLM_PROMPT,
-            input_variables=["vacancy_description", "candidate_profiles"]
-        )
-        chain = LLMChain(llm=llm, prompt=prompt_template) # Corrected: prompt=prompt_template
+    def _run(self, vacancy_id_or_description: str) -> str:
+        vector_store, _, _ = _get_rag()
+        if not vector_store:
+            return "Erro: Vector Store não disponível para correspondência de candidatos."
 
+        # Vaga pelo ID (metadados, sem embedding) ou pela descrição informada; os candidatos são sempre buscados
+        # com o texto "Candidatos adequados para a vaga: <descrição da vaga encontrada>"
+        candidate_profiles_data: List[Dict[str, Any]] = []
+        vacancy_info = self._get_vacancy_by_id(vector_store, vacancy_id_or_description)
+        if not vacancy_info: vacancy_info = self._get_vacancy_details(vector_store, get_embeddings().embed_query(vacancy_id_or_description))
+        if vacancy_info:
+            candidates_embedding = get_embeddings().embed_query(_candidates_query(vacancy_info["description"]))
+            candidate_profiles_data = self._find_candidate_profiles(vector_store, candidates_embedding)
+
+        matcher_inputs = self._build_matcher_inputs(vacancy_id_or_description, vacancy_info, candidate_profiles_data)
+        if isinstance(matcher_inputs, str): return matcher_inputs
         try:
-            response = chain.invoke({
-                "vacancy_description": f"ID Vaga: {vacancy_id}\nDescrição da Vaga:\n{vacancy_description_text}", # Provide full context
-                "candidate_profiles": candidate_profiles_text
-            })
-            # Assuming the LLMChain output has a 'text' key with the result
-            return response.get("text", "Não foi possível gerar a avaliação de compatibilidade.")
+            responses = _matcher_chain().batch(matcher_inputs) # Lotes avaliados em paralelo (thread pool do Runnable)
+            return _join_matcher_responses(responses)
         except Exception as e:
             return f"Erro ao avaliar candidatos com LLM: {e}"
 
     async def _arun(self, vacancy_id_or_description: str) -> str:
-        # For a true async implementation, _get_vacancy_details, _find_candidate_profiles,
-        # and LLMChain.ainvoke would need to be async.
-        # This is a fallback to the synchronous version.
-        # Consider using something like `return await asyncio.to_thread(self._run, vacancy_id_or_description)`
-        # if you want to run the sync code in a separate thread from an async context.
-        return self._run(vacancy_id_or_description)
+        vector_store, _, _ = _get_rag()
+        if not vector_store:
+            return "Erro: Vector Store não disponível para correspondência de candidatos."
+
+        # O cliente Chroma é síncrono: suas consultas rodam em threads (asyncio.to_thread).
+        # Embedding e LLM usam as APIs assíncronas, sem bloquear o event loop.
+        candidate_profiles_data: List[Dict[str, Any]] = []
+        vacancy_info = await asyncio.to_thread(self._get_vacancy_by_id, vector_store, vacancy_id_or_description)
+        if not vacancy_info:
+            vacancy_embedding = await get_embeddings().aembed_query(vacancy_id_or_description)
+            vacancy_info = await asyncio.to_thread(self._get_vacancy_details, vector_store, vacancy_embedding)
+        if vacancy_info:
+            candidates_embedding = await get_embeddings().aembed_query(_candidates_query(vacancy_info["description"]))
+            candidate_profiles_data = await asyncio.to_thread(self._find_candidate_profiles, vector_store, candidates_embedding)
+
+        matcher_inputs = self._build_matcher_inputs(vacancy_id_or_description, vacancy_info, candidate_profiles_data)
+        if isinstance(matcher_inputs, str): return matcher_inputs
+        try:
+            responses = await asyncio.gather(*(_matcher_chain().ainvoke(matcher_input) for matcher_input in matcher_inputs))
+            return _join_matcher_responses(responses)
+        except Exception as e:
+            return f"Erro ao avaliar candidatos com LLM: {e}"
 
 # Lista de ferramentas para o agente
 recruitment_tools: List[BaseTool] = [ # Corrected: Initialize the list with tool instances
@@ -1,6 +1,9 @@
 # app/core/config.py
+from pydantic import field_validator, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List, Optional, Any
+from typing import Any, List, Optional
+from functools import lru_cache
+from enum import Enum
 import os
 # A importação de load_dotenv e Path é opcional para o deploy no Cloud Run,
 # pois lá as variáveis de ambiente são injetadas diretamente.
@@ -29,6 +32,10 @@ else:
     logger.warning(f"Arquivo .env NÃO encontrado em: {DOTENV_PATH} para carregamento explícito. Configurações dependerão de variáveis de ambiente já definidas ou defaults da classe.")
 
 
+class VectorBackend(str, Enum):
+    CHROMA = "chroma" # Persistente (SQLite + HNSW), padrão
+    FAISS = "faiss"   # Índice plano em memória (IndexFlatIP): busca exata, menor overhead por consulta
+
 class Settings(BaseSettings):
     PROJECT_NAME: str = "IntelliMatch AI"
     API_V1_STR: str = "/api/v1"
@@ -50,10 +57,24 @@ class Settings(BaseSettings):
     # Se usar um volume montado (ex: GCS FUSE), o caminho será o ponto de montagem.
     CHROMA_DB_PATH: str = os.getenv("CHROMA_DB_PATH", "/app/vector_store_db") # Caminho dentro do container
     CHROMA_COLLECTION_NAME: str = os.getenv("CHROMA_COLLECTION_NAME", "intellimatch_collection")
+    # Backend do retriever do agente. Com "faiss" o índice é salvo/carregado de FAISS_INDEX_PATH
+    VECTOR_BACKEND: VectorBackend = VectorBackend(os.getenv("VECTOR_BACKEND", "chroma").lower())
+    FAISS_INDEX_PATH: str = os.getenv("FAISS_INDEX_PATH", "/app/vector_store_faiss")
+    # Cache em Arrow IPC dos docs brutos: reaproveitado na inicialização enquanto os JSONs de origem não mudarem. Vazio desativa.
+    RAW_DOCS_ARROW_PATH: str = os.getenv("RAW_DOCS_ARROW_PATH", "/app/raw_docs.arrow")
 
     # Configurações de Modelos
     EMBEDDING_MODEL_NAME: str = os.getenv("EMBEDDING_MODEL_NAME", "text-embedding-3-small")
+    # Opcional: text-embedding-3-* aceita vetores reduzidos (ex.: 512 ocupa 1/3 da memória de 1536).
+    # Sem valor usa a dimensão nativa do modelo. Com valor, a coleção do Chroma e o caminho do FAISS recebem o sufixo
+    # "_<N>d": a dimensão é fixa por coleção/índice, então um store existente com outra dimensão nunca é reutilizado.
+    EMBEDDING_DIMENSIONS: Optional[int] = int(os.environ["EMBEDDING_DIMENSIONS"]) if os.getenv("EMBEDDING_DIMENSIONS") else None
     LLM_MODEL_NAME: str = os.getenv("LLM_MODEL_NAME", "gpt-4o-mini")
+    # Chave de roteamento do prompt caching da OpenAI: requisições com o mesmo prefixo estático
+    # (system prompt do agente) vão para a mesma máquina, aumentando os acertos de cache
+    LLM_PROMPT_CACHE_KEY: str = os.getenv("LLM_PROMPT_CACHE_KEY", "intellimatch-agent")
+    # Máximo de chamadas simultâneas ao agente/LLM por worker; as demais aguardam na fila
+    MAX_CONCURRENT_LLM: int = int(os.getenv("MAX_CONCURRENT_LLM", "8"))
 
     # Caminhos para os arquivos de dados (relativos ao WORKDIR /app/ no container)
     # No Cloud Run, estes arquivos devem ser copiados para a imagem Docker durante o build.
@@ -77,29 +98,30 @@ class Settings(BaseSettings):
         case_sensitive=False # OPENAI_API_KEY é geralmente maiúscula no ambiente
     )
 
-    def __init__(self, **values: Any):
-        super().__init__(**values)
-        # Processa CORS_ORIGINS após a inicialização base
-        if self.CORS_ORIGINS_STR:
+    @field_validator("EMBEDDING_DIMENSIONS", mode="before")
+    @classmethod
+    def _empty_dimensions_as_native(cls, value: Any) -> Any:
+        return None if value == "" else value # EMBEDDING_DIMENSIONS= (vazio) também significa dimensão nativa
+
+    @model_validator(mode="after")
+    def _post_process(self) -> "Settings":
+        # Processa CORS_ORIGINS uma única vez, dentro da validação do pydantic (sem sobrescrever __init__)
+        if self.CORS_ORIGINS_STR: # CORS_ORIGINS_STR (ex.: variável do serviço no Cloud Run) tem precedência sobre CORS_ORIGINS
             self.CORS_ORIGINS = [origin.strip() for origin in self.CORS_ORIGINS_STR.split(',')]
         elif not self.CORS_ORIGINS: # Se não veio do env_str e o default da classe (lista vazia) ainda está lá
             self.CORS_ORIGINS = ["*"] # Default para desenvolvimento, permite todas as origens
+        if self.EMBEDDING_DIMENSIONS:
+            dims_suffix = f"_{self.EMBEDDING_DIMENSIONS}d"
+            if not self.CHROMA_COLLECTION_NAME.endswith(dims_suffix): self.CHROMA_COLLECTION_NAME += dims_suffix
+            if not self.FAISS_INDEX_PATH.endswith(dims_suffix): self.FAISS_INDEX_PATH += dims_suffix
+        return self
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    return Settings()
 
-        # Log de verificação da API Key DENTRO do __init__ após super().__init__()
-        # Neste ponto, pydantic-settings já tentou carregar do ambiente.
-        if self.OPENAI_API_KEY:
-            if len(self.OPENAI_API_KEY) == 51 and self.OPENAI_API_KEY.startswith("sk-"):
-                 logger.info(f"Settings __init__: OpenAI API Key carregada e parece ter formato válido.")
-            else:
-                 logger.warning(f"Settings __init__: OpenAI API Key carregada, mas tem formato/comprimento incomum: {len(self.OPENAI_API_KEY)} caracteres. Verifique a configuração no Secret Manager/variáveis de ambiente do Cloud Run.")
-        else:
-            logger.error("ALERTA CRÍTICO (Settings __init__): OpenAI API Key é None ou vazia APÓS pydantic-settings tentar carregar!")
-            logger.error(f"Verifique se a variável de ambiente OPENAI_API_KEY (ou o segredo mapeado para ela) está corretamente configurada no serviço Cloud Run e se a conta de serviço tem permissão para acessá-la.")
-            # Descomente para parar a aplicação se a chave for essencial e não encontrada durante o startup.
-            # raise ValueError("Configuração crítica OPENAI_API_KEY ausente. A aplicação não pode iniciar.")
-
-# Instancia o objeto settings para ser importado e usado em toda a aplicação
-settings = Settings()
+# Instância única (cacheada por get_settings) importada e usada em toda a aplicação
+settings = get_settings()
 
 # Verificação adicional após a instanciação (para logs de startup)
 if not settings.OPENAI_API_KEY:
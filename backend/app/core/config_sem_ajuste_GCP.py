@@ -1,6 +1,7 @@
 # app/core/config.py
+from pydantic import Field, ValidationInfo, field_validator, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List, Optional, Any
+from typing import List, Optional
 import os
 from dotenv import load_dotenv
 from pathlib import Path
@@ -26,7 +27,7 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: Optional[str] = None 
 
     CORS_ORIGINS_STR: Optional[str] = None
-    CORS_ORIGINS: List[str] = []
+    CORS_ORIGINS: List[str] = Field(default=[], validate_default=True)
 
     CHROMA_DB_PATH: str = "./vector_store_db"
     CHROMA_COLLECTION_NAME: str = "intellimatch_collection"
@@ -42,24 +43,31 @@ class Settings(BaseSettings):
         env_file=DOTENV_PATH if DOTENV_PATH.exists() else None,
         env_file_encoding='utf-8',
         extra='ignore',
-        case_sensitive=False
+        case_sensitive=False,
+        frozen=True # Configuração imutável após o carregamento
     )
 
-    def __init__(self, **values: Any):
-        super().__init__(**values)
-        if self.CORS_ORIGINS_STR:
-            self.CORS_ORIGINS = [origin.strip() for origin in self.CORS_ORIGINS_STR.split(',')]
-        elif not self.CORS_ORIGINS:
-            self.CORS_ORIGINS = ["*"]
+    # Com frozen=True não há atribuição pós-init: CORS_ORIGINS é derivado durante a validação
+    # (CORS_ORIGINS_STR é declarado antes, então já está em info.data)
+    @field_validator("CORS_ORIGINS", mode="after")
+    @classmethod
+    def _populate_cors(cls, value: List[str], info: ValidationInfo) -> List[str]:
+        cors_origins_str = info.data.get("CORS_ORIGINS_STR")
+        if cors_origins_str:
+            return [origin.strip() for origin in cors_origins_str.split(',')]
+        return value or ["*"]
 
+    @model_validator(mode="after")
+    def _check_api_key(self) -> "Settings":
         if self.OPENAI_API_KEY:
             if len(self.OPENAI_API_KEY) == 51 and self.OPENAI_API_KEY.startswith("sk-"):
-                 logger.info(f"Settings __init__: OpenAI API Key carregada e parece ter formato válido.")
+                 logger.info(f"Settings: OpenAI API Key carregada e parece ter formato válido.")
             else:
-                 logger.warning(f"Settings __init__: OpenAI API Key carregada, mas tem formato/comprimento incomum: {len(self.OPENAI_API_KEY)} caracteres. Verifique o .env.")
+                 logger.warning(f"Settings: OpenAI API Key carregada, mas tem formato/comprimento incomum: {len(self.OPENAI_API_KEY)} caracteres. Verifique o .env.")
         else:
-            logger.error("ALERTA CRÍTICO (Settings __init__): OpenAI API Key é None ou vazia APÓS pydantic-settings tentar carregar!")
+            logger.error("ALERTA CRÍTICO (Settings): OpenAI API Key é None ou vazia APÓS pydantic-settings tentar carregar!")
             # raise ValueError("OPENAI_API_KEY não configurada.")
+        return self
 
 settings = Settings()
 
@@ -1,25 +1,51 @@
-# app/data_processing/loader.py
-import json
+# app/data_processing/loader_complete.py
+import hashlib
 import logging
-from typing import List, Dict, Tuple, Any, Optional
+import mmap
+import multiprocessing
+import os
+import sys
+import time
+from typing import List, Dict, Tuple, Any, Optional, Iterable, Iterator, Callable
 from pathlib import Path
-from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from itertools import chain
+
+import ijson
+import orjson
+import tiktoken
+try: import fcntl
+except ImportError: fcntl = None # Windows: sem lock entre processos (rode um único worker)
+try: import pyarrow as pa
+except ImportError: pa = None # Opcional: sem pyarrow os docs brutos ficam em um dict Python
 
 from langchain_core.documents import Document
-# Considere mudar para: from langchain_chroma import Chroma (após instalar langchain-chroma e testar)
-from langchain_community.vectorstores.chroma import Chroma
+import chromadb
+import openai
+from chromadb.errors import ChromaError
+from langchain_chroma import Chroma
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain_core.embeddings import Embeddings
 
-from app.core.config import settings
+from app.core.config import settings, VectorBackend
 
 logger = logging.getLogger(__name__)
 
+# Caminhos de origem resolvidos uma vez no import (gravados no metadado "source" de cada documento)
+_VAGAS_SRC = settings.DATA_PATH_VAGAS
+_APPLICANTS_SRC = settings.DATA_PATH_APPLICANTS
+_PROSPECTS_SRC = settings.DATA_PATH_PROSPECTS
+
 def safe_filter_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
     """
     Filtra e sanitiza metadados para garantir que os valores são de tipos simples
     aceitáveis pelo ChromaDB (str, int, float, bool, None).
     Converte listas de tipos simples para strings separadas por vírgula.
     Outros tipos complexos são convertidos para sua representação string, com truncamento.
+    Não modifica o dict de entrada (sempre monta um novo): os chamadores o repassam sem copiar.
     """
     if not isinstance(metadata, dict):
         logger.warning(f"safe_filter_metadata recebeu algo que não é um dict: {type(metadata)}. Retornando dict vazio.")
@@ -36,9 +62,9 @@ def safe_filter_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
             safe_meta[key] = ", ".join(simple_list_items) if simple_list_items else "" 
         elif isinstance(value, dict):
             try:
-                json_str = json.dumps(value)
+                json_str = orjson.dumps(value).decode() # compacto e em UTF-8 (sem escapes \uXXXX): mais conteúdo útil nos 450 chars
                 safe_meta[key] = json_str[:450] + "..." if len(json_str) > 453 else json_str # Limite um pouco maior para JSON
-            except TypeError:
+            except orjson.JSONEncodeError:
                 str_value = str(value)
                 safe_meta[key] = str_value[:450] + "..." if len(str_value) > 453 else str_value
             logger.debug(f"Metadado '{key}' era um dicionário e foi convertido para string.")
@@ -64,25 +90,79 @@ def _create_error_metadata(source_type: str, doc_id: str, error_message: str, or
         "has_valid_metadata": False
     }
 
+# Orçamento do CV em tokens do modelo de embeddings (não em caracteres). Mantém cada lote de add_documents
+# (200 docs) abaixo do limite de tokens por requisição da API de embeddings.
+_CV_TOKEN_BUDGET = 1000
+
+@lru_cache(maxsize=1)
+def _get_cv_encoder() -> Optional[tiktoken.Encoding]:
+    # Carregado sob demanda (inclusive em cada worker do pool de textualização), não no import. Falha ao obter o
+    # arquivo BPE (container offline) fica em cache como None: uma única tentativa e um único aviso por processo
+    try:
+        try: return tiktoken.encoding_for_model(settings.EMBEDDING_MODEL_NAME)
+        except KeyError: return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Encoder tiktoken indisponível ({e}); CVs serão cortados por caracteres (~4 caracteres/token)."); return None
+
+def _truncate_cv(cv_text: str) -> str:
+    encoder = _get_cv_encoder()
+    if encoder is None: return cv_text[:_CV_TOKEN_BUDGET * 4]
+    tokens = encoder.encode(cv_text, disallowed_special=())
+    return cv_text if len(tokens) <= _CV_TOKEN_BUDGET else encoder.decode(tokens[:_CV_TOKEN_BUDGET])
+
+# Valores tratados como "sem informação" (comparados após strip().lower()); constantes para lookup O(1) sem alocar lista por registro
+_MISSING_VALUES = frozenset({"", "none", "n/a"})
+_EMPTY_VALUES = _MISSING_VALUES | {"nenhum"}
+_EMPTY_KT_VALUES = frozenset({"", "n/a"})
+
+def _coerce_csv(value: Any) -> str:
+    # Campos que vêm como string ou lista; type() is str atende o caso comum sem o custo de isinstance
+    return value if type(value) is str else ", ".join(map(str, value)) if type(value) is list else "N/A"
+
+_MMAP_MIN_BYTES = 50 * 1024 * 1024 # Abaixo disso o custo de montar o mmap não compensa
+
 def _load_json_file(file_path: str) -> Dict:
     path = Path(file_path)
     if not path.exists():
         logger.error(f"Arquivo JSON não encontrado em: {file_path}")
         return {}
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        if path.stat().st_size > _MMAP_MIN_BYTES:
+            # Arquivo grande: orjson lê direto das páginas mapeadas, sem a cópia intermediária em bytes
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                data = orjson.loads(view)
+        else:
+            with open(path, 'rb') as f:
+                data = orjson.loads(f.read()) # orjson (C) decodifica UTF-8 direto dos bytes, bem mais rápido que json.load
         logger.info(f"Arquivo {file_path} carregado com sucesso ({len(data)} chaves no nível raiz).")
         return data
-    except json.JSONDecodeError as e_json:
+    except orjson.JSONDecodeError as e_json:
         logger.error(f"Erro ao decodificar JSON de {file_path}: {e_json}")
         return {}
     except Exception as e_gen:
         logger.error(f"Erro inesperado ao carregar {file_path}: {e_gen}", exc_info=True)
         return {}
 
+def _stream_prospects(file_path: str) -> Iterator[Tuple[str, Any]]:
+    """Itera (vaga_id, dados) de prospects.json sob demanda: só uma vaga por vez fica em memória."""
+    path = Path(file_path)
+    if not path.exists():
+        logger.error(f"Arquivo JSON não encontrado em: {file_path}")
+        return
+    count = 0
+    try:
+        with open(path, 'rb') as f:
+            for vaga_id, prospect_geral_data in ijson.kvitems(f, '', use_float=True):
+                count += 1
+                yield vaga_id, prospect_geral_data
+        logger.info(f"Arquivo {file_path} lido em streaming com sucesso ({count} chaves no nível raiz).")
+    except ijson.JSONError as e_json:
+        logger.error(f"Erro ao decodificar JSON de {file_path} após {count} chaves: {e_json}")
+    except Exception as e_gen:
+        logger.error(f"Erro inesperado ao ler {file_path} em streaming: {e_gen}", exc_info=True)
+
 def _textualize_vaga(vaga_id: str, vaga_data: Dict) -> Tuple[str, Dict[str, Any]]:
-    doc_source_file = settings.DATA_PATH_VAGAS
+    doc_source_file = _VAGAS_SRC
     
     try:
         if not isinstance(vaga_data, dict):
@@ -102,35 +182,33 @@ def _textualize_vaga(vaga_id: str, vaga_data: Dict) -> Tuple[str, Dict[str, Any]
         nivel_academico = str(pv.get("nivel_academico", "N/A"))
         nivel_ingles = str(pv.get("nivel_ingles", "N/A"))
         nivel_espanhol = str(pv.get("nivel_espanhol", "N/A"))
+        nivel_espanhol_norm = nivel_espanhol.strip().lower()
         areas_atuacao_raw = pv.get("areas_atuacao", "N/A")
         principais_atividades = str(pv.get("principais_atividades", "N/A"))
         competencias_tecnicas = str(pv.get("competencia_tecnicas_e_comportamentais", "N/A"))
         local_trabalho = str(pv.get("local_trabalho", "N/A"))
         demais_obs = str(pv.get("demais_observacoes", ""))
 
-        content_parts = [
-            f"VAGA: {titulo}", f"ID da Vaga: {vaga_id}", f"Cliente: {cliente}",
-            f"Tipo de Contratação: {tipo_contratacao}", f"É vaga SAP? {vaga_sap}",
-            f"Nível Profissional Requerido: {nivel_profissional}",
-            f"Nível Acadêmico: {nivel_academico}", f"Nível de Inglês: {nivel_ingles}"
-        ]
-        if nivel_espanhol.strip().lower() not in ["n/a", "nenhum", "", "none"]:
-            content_parts.append(f"Nível de Espanhol: {nivel_espanhol}")
-        
-        areas_atuacao_str = areas_atuacao_raw if isinstance(areas_atuacao_raw, str) else ', '.join(map(str, areas_atuacao_raw)) if isinstance(areas_atuacao_raw, list) else 'N/A'
-        content_parts.append(f"Áreas de Atuação: {areas_atuacao_str}")
-        content_parts.append(f"Local de Trabalho: {local_trabalho}")
-        content_parts.append(f"Principais Atividades:\n{principais_atividades}")
-        content_parts.append(f"Competências Técnicas e Comportamentais Requeridas:\n{competencias_tecnicas}")
-        if demais_obs: content_parts.append(f"Observações Adicionais: {demais_obs}")
-        content = "\n".join(filter(None, content_parts))
+        areas_atuacao_str = _coerce_csv(areas_atuacao_raw)
+        espanhol_line = f"\nNível de Espanhol: {nivel_espanhol}" if nivel_espanhol_norm not in _EMPTY_VALUES else ""
+        obs_line = f"\nObservações Adicionais: {demais_obs}" if demais_obs else ""
+        # Conteúdo montado num único f-string (sem lista intermediária + join): uma só cópia dos campos longos
+        content = (
+            f"VAGA: {titulo}\nID da Vaga: {vaga_id}\nCliente: {cliente}\n"
+            f"Tipo de Contratação: {tipo_contratacao}\nÉ vaga SAP? {vaga_sap}\n"
+            f"Nível Profissional Requerido: {nivel_profissional}\n"
+            f"Nível Acadêmico: {nivel_academico}\nNível de Inglês: {nivel_ingles}{espanhol_line}\n"
+            f"Áreas de Atuação: {areas_atuacao_str}\nLocal de Trabalho: {local_trabalho}\n"
+            f"Principais Atividades:\n{principais_atividades}\n"
+            f"Competências Técnicas e Comportamentais Requeridas:\n{competencias_tecnicas}{obs_line}"
+        )
 
         metadata_dict = {
             "source": doc_source_file, "type": "vaga", "codigo_vaga": str(vaga_id),
             "titulo_vaga": titulo, "cliente": cliente, "vaga_sap": vaga_sap,
             "tipo_contratacao": tipo_contratacao, "nivel_profissional": nivel_profissional,
             "nivel_academico": nivel_academico, "nivel_ingles": nivel_ingles,
-            "nivel_espanhol": nivel_espanhol if nivel_espanhol.strip().lower() not in ["", "none", "n/a"] else "N/A",
+            "nivel_espanhol": nivel_espanhol if nivel_espanhol_norm not in _MISSING_VALUES else "N/A",
             "areas_atuacao": areas_atuacao_raw, 
             "local_trabalho": local_trabalho,
             "principais_atividades": principais_atividades, 
@@ -143,7 +221,7 @@ def _textualize_vaga(vaga_id: str, vaga_data: Dict) -> Tuple[str, Dict[str, Any]
         return f"Erro ao processar vaga ID {vaga_id}: {str(e)[:200]}", _create_error_metadata(doc_source_file, vaga_id, str(e), original_exception=e)
 
 def _textualize_applicant(applicant_id: str, app_data: Dict) -> Tuple[str, Dict[str, Any]]:
-    doc_source_file = settings.DATA_PATH_APPLICANTS
+    doc_source_file = _APPLICANTS_SRC
     
     try:
         if not isinstance(app_data, dict):
@@ -165,23 +243,24 @@ def _textualize_applicant(applicant_id: str, app_data: Dict) -> Tuple[str, Dict[
         nivel_academico = str(fi.get("nivel_academico", "N/A"))
         nivel_ingles = str(fi.get("nivel_ingles", "N/A"))
         nivel_espanhol = str(fi.get("nivel_espanhol", "N/A"))
+        nivel_espanhol_norm = nivel_espanhol.strip().lower()
         cv_pt = str(app_data.get("cv_pt", "CV não disponível."))
 
         content_parts = [f"CANDIDATO: {nome}", f"ID do Candidato: {applicant_id}"]
         if objetivo: content_parts.append(f"Objetivo Profissional: {objetivo}")
         
-        area_atuacao_str = area_atuacao_raw if isinstance(area_atuacao_raw, str) else ', '.join(map(str, area_atuacao_raw)) if isinstance(area_atuacao_raw, list) else 'N/A'
+        area_atuacao_str = _coerce_csv(area_atuacao_raw)
         content_parts.append(f"Área de Atuação: {area_atuacao_str}")
         content_parts.append(f"Nível Profissional: {nivel_profissional_candidato}")
         content_parts.append(f"Nível Acadêmico: {nivel_academico}")
         content_parts.append(f"Nível de Inglês: {nivel_ingles}")
-        if nivel_espanhol.strip().lower() not in ["n/a", "nenhum", "", "none"]:
+        if nivel_espanhol_norm not in _EMPTY_VALUES:
             content_parts.append(f"Nível de Espanhol: {nivel_espanhol}")
         
-        kt_str = conhecimentos_tecnicos_raw if isinstance(conhecimentos_tecnicos_raw, str) else ', '.join(map(str, conhecimentos_tecnicos_raw)) if isinstance(conhecimentos_tecnicos_raw, list) else 'N/A'
-        if conhecimentos_tecnicos_raw and kt_str.strip().lower() not in ['n/a', '']:
+        kt_str = _coerce_csv(conhecimentos_tecnicos_raw)
+        if conhecimentos_tecnicos_raw and kt_str.strip().lower() not in _EMPTY_KT_VALUES:
             content_parts.append(f"Conhecimentos Técnicos: {kt_str}")
-        content_parts.append(f"\n--- Resumo do CV ---\n{cv_pt[:3500]}...\n--- Fim do Resumo do CV ---") # Trunca CVs longos
+        content_parts.append(f"\n--- Resumo do CV ---\n{_truncate_cv(cv_pt)}...\n--- Fim do Resumo do CV ---") # Trunca CVs longos por tokens
         content = "\n".join(filter(None, content_parts))
 
         metadata_dict = {
@@ -191,7 +270,7 @@ def _textualize_applicant(applicant_id: str, app_data: Dict) -> Tuple[str, Dict[
             "conhecimentos_tecnicos": conhecimentos_tecnicos_raw, 
             "nivel_profissional_candidato": nivel_profissional_candidato,
             "nivel_academico": nivel_academico, "nivel_ingles": nivel_ingles,
-            "nivel_espanhol": nivel_espanhol if nivel_espanhol.strip().lower() not in ["", "none", "n/a"] else "N/A",
+            "nivel_espanhol": nivel_espanhol if nivel_espanhol_norm not in _MISSING_VALUES else "N/A",
             "has_valid_metadata": True
         }
         return content, metadata_dict
@@ -200,7 +279,7 @@ def _textualize_applicant(applicant_id: str, app_data: Dict) -> Tuple[str, Dict[
         return f"Erro ao processar candidato ID {applicant_id}. Detalhe: {str(e)[:200]}", _create_error_metadata(doc_source_file, applicant_id, str(e), original_exception=e)
 
 def _textualize_prospect(vaga_id_prospect: str, prospect_entry_data: Dict, vaga_titulo_geral: str, prospect_index: int) -> Tuple[str, Dict[str, Any]]:
-    doc_source_file = settings.DATA_PATH_PROSPECTS
+    doc_source_file = _PROSPECTS_SRC
     codigo_candidato_prospect = str(prospect_entry_data.get("codigo", f"unknown_{prospect_index}"))
     prospect_unique_id_part = f"vaga_{vaga_id_prospect}_cand_{codigo_candidato_prospect}_idx_{prospect_index}"
     
@@ -235,53 +314,71 @@ def _textualize_prospect(vaga_id_prospect: str, prospect_entry_data: Dict, vaga_
     except Exception as e:
         return f"Erro ao processar prospect ({prospect_unique_id_part}). Detalhe: {str(e)[:200]}", _create_error_metadata(doc_source_file, prospect_unique_id_part, str(e), original_exception=e)
 
+# Textualização é CPU-bound e pura: em lotes grandes roda num pool de processos (Documents são montados no processo principal)
+_TEXTUALIZE_CHUNKSIZE = 512
+
+def _map_textualize(executor: Optional[Executor], func, ids: List[str], datas: Iterable[Any]) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    return executor.map(func, ids, datas, chunksize=_TEXTUALIZE_CHUNKSIZE) if executor else map(func, ids, datas)
+
+# Campos categóricos (baixa cardinalidade): uma única instância de cada valor entre todos os documentos
+_INTERNED_METADATA_KEYS = frozenset({
+    "source", "type", "cliente", "vaga_sap", "tipo_contratacao", "nivel_profissional", "nivel_profissional_candidato",
+    "nivel_academico", "nivel_ingles", "nivel_espanhol", "situacao_candidato",
+})
+
+def _intern_categorical(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    for key in _INTERNED_METADATA_KEYS & metadata.keys():
+        if type(metadata[key]) is str: metadata[key] = sys.intern(metadata[key])
+    return metadata
+
+def _to_document(content: str, metadata: Any, label: str) -> Optional[Document]:
+    """Monta o Document de um registro textualizado; registros com erro são descartados (sem alocar Document)."""
+    if not isinstance(metadata, dict): # Segurança extra
+        logger.error(f"PÓS-TEXTUALIZE (INESPERADO): Metadados de {label} não é dict. Tipo: {type(metadata)}. Pulando.")
+        return None
+    # has_valid_metadata=False: _textualize_* retornou metadados de erro (já logados em _create_error_metadata)
+    if not metadata.get("has_valid_metadata", False): return None
+    # Internado aqui, no processo principal: strings internadas nos workers do pool voltam como cópias ao serem despickladas
+    return Document(page_content=content, metadata=_intern_categorical(safe_filter_metadata(metadata)))
+
 def _create_documents_from_data(
     vagas_data: Dict,
     applicants_data: Dict,
-    prospects_data: Dict
+    prospects_data: Iterable[Tuple[str, Any]]
 ) -> Tuple[List[Document], Dict[str, Document]]:
-    documents: List[Document] = []
     raw_docs_dict: Dict[str, Document] = {} 
 
-    logger.info("Processando dados de vagas...")
-    for vaga_id, vaga_content in vagas_data.items():
-        try:
-            content, metadata = _textualize_vaga(str(vaga_id), vaga_content)
-            
-            if not isinstance(metadata, dict): # Segurança extra
-                logger.error(f"PÓS-TEXTUALIZE (INESPERADO): Metadados de vaga {vaga_id} não é dict. Tipo: {type(metadata)}. Pulando.")
-                continue 
-            
-            # Usa safe_filter_metadata apenas se os metadados originais foram considerados válidos
-            # Se 'has_valid_metadata' for False, significa que _textualize_vaga já retornou metadados de erro.
-            filtered_meta = safe_filter_metadata(metadata.copy()) if metadata.get("has_valid_metadata", False) else metadata
-            
-            doc = Document(page_content=content, metadata=filtered_meta)
-            documents.append(doc)
-            if filtered_meta.get("has_valid_metadata", False): # Adiciona ao raw_dict apenas se os metadados são válidos
-                 raw_docs_dict[f"vaga_{vaga_id}"] = doc
-        except Exception as e:
-            logger.error(f"Exceção inesperada no loop de _create_documents_from_data para vaga ID {vaga_id}: {e}", exc_info=True)
-
-    logger.info("Processando dados de candidatos...")
-    for app_id, app_content in applicants_data.items():
+    vaga_ids = [str(vaga_id) for vaga_id in vagas_data]
+    app_ids = [str(app_id) for app_id in applicants_data]
+    # Abaixo de um chunk o custo de subir processos e serializar os dados supera o ganho
+    use_pool = len(vaga_ids) + len(app_ids) > _TEXTUALIZE_CHUNKSIZE
+    logger.info(f"Textualizando {len(vaga_ids)} vagas e {len(app_ids)} candidatos{' em paralelo (ProcessPoolExecutor)' if use_pool else ''}...")
+    # spawn (não fork): esta carga roda numa thread do lifespan, com clientes httpx/Chroma e threads de inicialização já ativos;
+    # um fork herdaria locks presos por essas threads e poderia travar o worker. Os workers só precisam das funções puras de textualização
+    with (ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) if use_pool else nullcontext()) as executor:
+        vaga_results = _map_textualize(executor, _textualize_vaga, vaga_ids, vagas_data.values())
+        app_results = _map_textualize(executor, _textualize_applicant, app_ids, applicants_data.values())
+        vaga_results, app_results = list(vaga_results), list(app_results)
+
+    logger.info("Processando dados de vagas e candidatos...")
+    # Quantidade de vagas/candidatos é conhecida: lista pré-alocada e preenchida por índice (sobras de registros com erro são cortadas)
+    documents = [None] * (len(vaga_ids) + len(app_ids))
+    set_document = documents.__setitem__
+    doc_idx = 0
+    labeled_results = chain(zip((f"vaga_{vaga_id}" for vaga_id in vaga_ids), vaga_results), zip((f"candidato_{app_id}" for app_id in app_ids), app_results))
+    for raw_key, (content, metadata) in labeled_results:
         try:
-            content, metadata = _textualize_applicant(str(app_id), app_content)
-            if not isinstance(metadata, dict):
-                logger.error(f"PÓS-TEXTUALIZE (INESPERADO): Metadados de candidato {app_id} não é dict. Tipo: {type(metadata)}. Pulando.")
-                continue
-            
-            filtered_meta = safe_filter_metadata(metadata.copy()) if metadata.get("has_valid_metadata", False) else metadata
-            doc = Document(page_content=content, metadata=filtered_meta)
-            documents.append(doc)
-            if filtered_meta.get("has_valid_metadata", False):
-                raw_docs_dict[f"candidato_{app_id}"] = doc
+            doc = _to_document(content, metadata, raw_key)
+            if doc is None: continue
+            set_document(doc_idx, doc); doc_idx += 1
+            raw_docs_dict[raw_key] = doc
         except Exception as e:
-            logger.error(f"Exceção inesperada no loop de _create_documents_from_data para candidato ID {app_id}: {e}", exc_info=True)
+            logger.error(f"Exceção inesperada no loop de _create_documents_from_data para {raw_key}: {e}", exc_info=True)
+    del documents[doc_idx:]
 
     logger.info("Processando dados de prospects...")
     global_prospect_index = 0 
-    for vaga_id_prospect, prospect_geral_data in prospects_data.items():
+    for vaga_id_prospect, prospect_geral_data in prospects_data:
         if not isinstance(prospect_geral_data, dict):
             logger.warning(f"Entrada de prospect para vaga_id {vaga_id_prospect} não é um dicionário. Pulando.")
             continue
@@ -295,103 +392,318 @@ def _create_documents_from_data(
                 unique_prospect_idx = global_prospect_index
                 global_prospect_index +=1
                 content, metadata = _textualize_prospect(str(vaga_id_prospect), entry, vaga_titulo_geral, unique_prospect_idx)
-                if not isinstance(metadata, dict):
-                    logger.error(f"PÓS-TEXTUALIZE (INESPERADO): Metadados de prospect (vaga {vaga_id_prospect}, cand {entry.get('codigo')}) não é dict. Pulando.")
-                    continue
-                
-                filtered_meta = safe_filter_metadata(metadata.copy()) if metadata.get("has_valid_metadata", False) else metadata
-                doc = Document(page_content=content, metadata=filtered_meta)
-                documents.append(doc)
+                doc = _to_document(content, metadata, f"prospect (vaga {vaga_id_prospect}, cand {entry.get('codigo')})")
+                if doc is not None: documents.append(doc)
             except Exception as e:
                 logger.error(f"Exceção inesperada no loop de _create_documents_from_data para prospect (Vaga {vaga_id_prospect}, Candidato {entry.get('codigo')}): {e}", exc_info=True)
     
     logger.info(f"Total de {len(documents)} documentos preparados. {len(raw_docs_dict)} docs no raw_dict (vagas/candidatos).")
     return documents, raw_docs_dict
 
+# Backoff exponencial (2s, 4s, 8s, ...) para 429 da API de embeddings, além das retentativas do próprio cliente OpenAI
+_RATE_LIMIT_MAX_RETRIES = 5
+_RATE_LIMIT_BASE_DELAY_S = 2.0
+
+# IDs estáveis do ChromaDB por tipo de documento (despacho por dict em vez de if/elif por documento)
+_ID_BUILDERS = {
+    "vaga": lambda m, i: f"vaga_{m.get('codigo_vaga', f'v_err_{i}')}",
+    "candidato": lambda m, i: f"candidato_{m.get('codigo_profissional', f'c_err_{i}')}",
+    "prospect": lambda m, i: f"prospect_{m.get('vaga_id_associada', 'NA')}_{m.get('codigo_candidato_associado', 'NA')}_{m.get('prospect_identifier_index', i)}",
+}
+
+def _default_doc_id(metadata: Dict[str, Any], i: int) -> str:
+    # Documentos de erro (type="error_document") não devem chegar aqui devido ao filtro anterior,
+    # mas se chegarem, terão um ID baseado no original_id
+    return f"{metadata.get('type', 'unknown')}_{metadata.get('original_id', f'untyped_idx_{i}')}"
+
+# Lotes de add_documents enviados em paralelo (ajuste ao limite de requisições/minuto da conta OpenAI)
+_ADD_BATCH_WORKERS = 8
+# Docs por requisição de embeddings (CVs têm até ~1k tokens): mantém cada requisição abaixo do limite de tokens da API
+_EMBED_BATCH_SIZE = 200 # << REDUZA ESTE VALOR SE O ERRO DE MAX_TOKENS PERSISTIR (ex: 100, 50)
+
+def _generate_doc_ids(documents: List[Document]) -> List[str]:
+    """IDs estáveis por documento (mesmos no Chroma e no FAISS); IDs repetidos abortam a ingestão."""
+    # Geração de IDs e detecção de duplicatas na mesma passada
+    doc_ids: List[str] = []; seen_ids: set = set(); duplicates: List[str] = []
+    for i, doc in enumerate(documents):
+        id_str = _ID_BUILDERS.get(doc.metadata.get("type"), _default_doc_id)(doc.metadata, i)
+        if id_str in seen_ids: duplicates.append(id_str)
+        else: seen_ids.add(id_str)
+        doc_ids.append(id_str)
+    if duplicates:
+        logger.error(f"ERRO CRÍTICO: {len(duplicates)} IDs duplicados gerados para o vector store! Duplicatas (até 20): {duplicates[:20]}")
+        raise ValueError(f"IDs duplicados detectados: {duplicates[:20]}.")
+    return doc_ids
+
+def _split_duplicate_content(documents: List[Document], doc_ids: List[str]) -> Tuple[List[Document], List[str], List[Document], List[str], List[str]]:
+    """Separa (docs a embeddar, IDs) de (docs com conteúdo repetido, IDs, ID do primeiro doc com o mesmo conteúdo)."""
+    # Conteúdo idêntico (ex.: prospect repetido na mesma vaga) é embeddado uma única vez: duplicatas reaproveitam o vetor do primeiro ID
+    seen_hashes: Dict[bytes, str] = {}
+    docs_to_embed: List[Document] = []; ids_to_embed: List[str] = []
+    dup_docs: List[Document] = []; dup_ids: List[str] = []; dup_first_ids: List[str] = []
+    for doc, doc_id in zip(documents, doc_ids):
+        first_id = seen_hashes.setdefault(hashlib.blake2b(doc.page_content.encode(), digest_size=16).digest(), doc_id)
+        if first_id == doc_id: docs_to_embed.append(doc); ids_to_embed.append(doc_id)
+        else: dup_docs.append(doc); dup_ids.append(doc_id); dup_first_ids.append(first_id)
+    if dup_ids: logger.info(f"{len(dup_ids)} docs com conteúdo duplicado não serão re-embeddados (vetor copiado do primeiro ID).")
+    return docs_to_embed, ids_to_embed, dup_docs, dup_ids, dup_first_ids
+
+def _run_embedding_batches(num_batches: int, process_batch: Callable[[int], int], target: str) -> int:
+    """Executa process_batch(i) para cada lote em paralelo, com backoff exponencial em 429; devolve o total de docs processados."""
+    def _with_retry(i: int) -> int:
+        for attempt in range(_RATE_LIMIT_MAX_RETRIES + 1):
+            try:
+                processed = process_batch(i)
+                logger.info(f"Lote {i+1}/{num_batches} adicionado/atualizado com sucesso ({target}).")
+                return processed
+            except openai.RateLimitError as e_rate:
+                if attempt == _RATE_LIMIT_MAX_RETRIES:
+                    logger.error(f"Lote {i+1}/{num_batches}: limite de requisições da OpenAI persistiu após {attempt} novas tentativas: {e_rate.response.text}"); raise
+                delay = _RATE_LIMIT_BASE_DELAY_S * 2 ** attempt
+                logger.warning(f"Lote {i+1}/{num_batches}: limite de requisições da OpenAI (429). Nova tentativa em {delay:.0f}s.")
+                time.sleep(delay)
+            except openai.APIStatusError as e_api:
+                logger.error(f"Erro da API OpenAI ao adicionar lote {i+1}/{num_batches} (status {e_api.status_code}): {e_api.response.text}"); raise
+            except openai.APIError as e_api:
+                logger.error(f"Erro da API OpenAI ao adicionar lote {i+1}/{num_batches}: {e_api}"); raise
+            except ChromaError as e_chroma:
+                logger.error(f"Erro do ChromaDB ao adicionar lote {i+1}/{num_batches}: {e_chroma}", exc_info=True); raise
+            except Exception as e_batch:
+                logger.error(f"Erro ao adicionar lote {i+1}/{num_batches} ao {target}: {e_batch}", exc_info=True); raise
+
+    # Cada lote espera um round-trip de embeddings (I/O): lotes em paralelo, limitados por _ADD_BATCH_WORKERS requisições simultâneas
+    with ThreadPoolExecutor(max_workers=_ADD_BATCH_WORKERS) as executor:
+        futures = [executor.submit(_with_retry, i) for i in range(num_batches)]
+        processed_count = 0
+        for future in as_completed(futures):
+            if future.exception() is not None:
+                for pending in futures: pending.cancel()
+                raise future.exception() # Re-levanta para parar o lifespan se um lote falhar
+            processed_count += future.result()
+    return processed_count
+
+# Um único PersistentClient por diretório: reaproveita a conexão SQLite em vez de reabri-la a cada Chroma(...)
+@lru_cache(maxsize=None)
+def _get_chroma_client(chroma_db_path: str) -> chromadb.ClientAPI:
+    return chromadb.PersistentClient(path=chroma_db_path)
+
+def _load_or_build_faiss(documents: List[Document], embedding_function: Embeddings) -> Optional[FAISS]:
+    """Carrega o índice FAISS salvo ou, se não existir, cria a partir dos documentos (IndexFlatIP) e salva."""
+    index_path = settings.FAISS_INDEX_PATH
+    # Embeddings da OpenAI são normalizados: produto interno == similaridade de cosseno
+    if (Path(index_path) / "index.faiss").exists():
+        vector_store = FAISS.load_local(index_path, embedding_function, allow_dangerous_deserialization=True, distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT)
+        logger.info(f"Índice FAISS carregado de {index_path} ({vector_store.index.ntotal} vetores).")
+        return vector_store
+    if not documents:
+        logger.warning(f"Índice FAISS inexistente em {index_path} e nenhum documento válido para criá-lo."); return None
+    doc_ids = _generate_doc_ids(documents)
+    docs_to_embed, ids_to_embed, dup_docs, dup_ids, dup_first_ids = _split_duplicate_content(documents, doc_ids)
+    num_batches = (len(docs_to_embed) + _EMBED_BATCH_SIZE - 1) // _EMBED_BATCH_SIZE
+    logger.info(f"Criando índice FAISS com {len(documents)} documentos ({len(docs_to_embed)} embeddados em {num_batches} lotes de (até) {_EMBED_BATCH_SIZE})...")
+    # Mesmos lotes/backoff do Chroma: um único embed_documents com o corpus inteiro estoura o limite de tokens por requisição
+    vectors: List[List[float]] = [None] * len(docs_to_embed)
+    def _embed_batch(i: int) -> int:
+        batch_start = i * _EMBED_BATCH_SIZE; batch_docs = docs_to_embed[batch_start:batch_start + _EMBED_BATCH_SIZE]
+        vectors[batch_start:batch_start + len(batch_docs)] = embedding_function.embed_documents([doc.page_content for doc in batch_docs])
+        return len(batch_docs)
+    _run_embedding_batches(num_batches, _embed_batch, "índice FAISS")
+    # Duplicatas entram no índice com seus próprios IDs e metadados, reaproveitando o vetor do primeiro ID
+    vector_by_id = dict(zip(ids_to_embed, vectors))
+    all_docs = docs_to_embed + dup_docs
+    vector_store = FAISS.from_embeddings(
+        list(zip((doc.page_content for doc in all_docs), vectors + [vector_by_id[first_id] for first_id in dup_first_ids])),
+        embedding_function, metadatas=[doc.metadata for doc in all_docs], ids=ids_to_embed + dup_ids,
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT,
+    )
+    # Grava em diretório temporário e move os arquivos: um leitor nunca encontra um índice pela metade.
+    # index.faiss por último, pois é a existência dele que indica índice completo
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    vector_store.save_local(tmp_path)
+    Path(index_path).mkdir(parents=True, exist_ok=True)
+    for file_name in ("index.pkl", "index.faiss"): os.replace(Path(tmp_path) / file_name, Path(index_path) / file_name)
+    Path(tmp_path).rmdir()
+    logger.info(f"Índice FAISS criado e salvo em {index_path} ({vector_store.index.ntotal} vetores).")
+    return vector_store
+
+# Versão do conteúdo gravado no cache Arrow: incrementar quando a textualização mudar, para invalidar arquivos antigos
+_RAW_DOCS_FORMAT_VERSION = 2 # 2: candidatos perdidos quando o encoder tiktoken não carregava
+
+def _raw_docs_fingerprint() -> bytes:
+    """Identifica os JSONs de origem (caminho, tamanho e mtime) a partir dos quais os docs brutos foram gerados."""
+    sources = []
+    for src in (settings.DATA_PATH_VAGAS, settings.DATA_PATH_APPLICANTS, settings.DATA_PATH_PROSPECTS):
+        try: stat = os.stat(src); sources.append([src, stat.st_size, stat.st_mtime_ns])
+        except OSError: sources.append([src, None, None])
+    return orjson.dumps([_RAW_DOCS_FORMAT_VERSION, sources])
+
+def _read_arrow_raw_docs(fingerprint: bytes) -> Optional[Dict[str, Document]]:
+    """Carrega os docs brutos do cache Arrow se ele foi gerado dos mesmos JSONs de origem; None se ausente ou desatualizado."""
+    path = settings.RAW_DOCS_ARROW_PATH
+    if pa is None or not path or not Path(path).exists(): return None
+    try:
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+            if (table.schema.metadata or {}).get(b"fingerprint") != fingerprint:
+                logger.info(f"Cache Arrow de docs brutos em {path} desatualizado (JSONs de origem mudaram). Será regravado."); return None
+            keys, contents, metadatas = (table.column(name).to_pylist() for name in ("key", "page_content", "metadata"))
+        # Materializado uma vez em dict: os endpoints de detalhe seguem com lookup O(1), sem decodificar a cada acesso
+        raw_docs = {key: Document(page_content=content, metadata=_intern_categorical(orjson.loads(metadata))) for key, content, metadata in zip(keys, contents, metadatas)}
+        logger.info(f"{len(raw_docs)} docs brutos carregados do cache Arrow {path} (JSONs de origem inalterados).")
+        return raw_docs
+    except Exception as e:
+        logger.warning(f"Falha ao ler cache Arrow de docs brutos ({path}): {e}. Os JSONs serão processados."); return None
+
+def _write_arrow_raw_docs(raw_docs: Dict[str, Document], fingerprint: bytes) -> None:
+    """Grava os docs brutos em Arrow IPC, com o fingerprint dos JSONs de origem nos metadados do schema."""
+    path = settings.RAW_DOCS_ARROW_PATH
+    if pa is None or not path or not raw_docs: return
+    try:
+        docs = list(raw_docs.values())
+        batch = pa.record_batch({
+            "key": pa.array(list(raw_docs.keys()), pa.string()),
+            "page_content": pa.array([d.page_content for d in docs], pa.large_string()),
+            "metadata": pa.array([orjson.dumps(d.metadata) for d in docs], pa.large_binary()),
+        }).replace_schema_metadata({b"fingerprint": fingerprint})
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Arquivo temporário + os.replace: um leitor concorrente nunca vê o arquivo pela metade
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, batch.schema) as writer: writer.write_batch(batch)
+        os.replace(tmp_path, path)
+        logger.info(f"{len(raw_docs)} docs brutos gravados no cache Arrow {path}.")
+    except Exception as e:
+        logger.error(f"Falha ao gravar cache Arrow de docs brutos ({path}): {e}", exc_info=True)
+
+def _open_populated_store(chroma_db_path: str, collection_name: str, embedding_function: Embeddings) -> Optional[Chroma]:
+    """Abre o vector store persistido se já estiver populado; None se for preciso (re)construí-lo a partir dos documentos."""
+    if settings.VECTOR_BACKEND is VectorBackend.FAISS:
+        return _load_or_build_faiss([], embedding_function) if (Path(settings.FAISS_INDEX_PATH) / "index.faiss").exists() else None
+    vector_store = Chroma(client=_get_chroma_client(chroma_db_path), collection_name=collection_name, embedding_function=embedding_function)
+    return vector_store if vector_store._collection.count() > 0 else None
+
 _vector_store_cache: Optional[Chroma] = None
 _raw_docs_dict_cache: Dict[str, Document] = {}
 
+@contextmanager
+def _ingest_lock(lock_path: str) -> Iterator[None]:
+    """Lock exclusivo entre processos (flock) enquanto os stores são carregados/populados; no-op sem fcntl."""
+    if fcntl is None: yield; return
+    Path(lock_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try: yield
+        finally: fcntl.flock(lock_file, fcntl.LOCK_UN)
+
 def load_and_process_data(
     chroma_db_path: str,
     collection_name: str,
     embedding_function: Embeddings 
+) -> Tuple[List[Document], Optional[Chroma], Dict[str, Document]]:
+    # Com vários workers só um processo por vez ingere no Chroma / grava FAISS e o cache Arrow; os demais esperam
+    # o lock e encontram os stores já populados (caminho rápido, sem re-embeddar)
+    with _ingest_lock(f"{chroma_db_path.rstrip('/')}.lock"):
+        return _load_and_process_data_locked(chroma_db_path, collection_name, embedding_function)
+
+def _load_and_process_data_locked(
+    chroma_db_path: str,
+    collection_name: str,
+    embedding_function: Embeddings 
 ) -> Tuple[List[Document], Optional[Chroma], Dict[str, Document]]:
     global _vector_store_cache, _raw_docs_dict_cache
     
     logger.info("Iniciando carregamento e processamento de dados...")
-    vagas_data = _load_json_file(settings.DATA_PATH_VAGAS)
-    applicants_data = _load_json_file(settings.DATA_PATH_APPLICANTS)
-    prospects_data = _load_json_file(settings.DATA_PATH_PROSPECTS)
-
-    if not (vagas_data or applicants_data or prospects_data):
+    # JSONs de origem inalterados desde a última carga e vector store já populado: parse e textualização são dispensáveis
+    raw_docs_fingerprint = _raw_docs_fingerprint()
+    cached_raw_docs = _read_arrow_raw_docs(raw_docs_fingerprint)
+    if cached_raw_docs is not None:
+        try: populated_store = _open_populated_store(chroma_db_path, collection_name, embedding_function)
+        except Exception as e: logger.warning(f"Falha ao abrir o vector store persistido: {e}. Os JSONs serão processados."); populated_store = None
+        if populated_store is not None:
+            logger.info("Vector store já populado e docs brutos em cache: processamento dos JSONs ignorado.")
+            _vector_store_cache, _raw_docs_dict_cache = populated_store, cached_raw_docs
+            return [], _vector_store_cache, _raw_docs_dict_cache
+
+    # Leituras independentes em paralelo (ganho maior em disco de rede, ex.: gcsfuse); threads e não asyncio.run,
+    # pois esta função pode ser chamada de dentro do event loop do lifespan
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        vagas_future = executor.submit(_load_json_file, settings.DATA_PATH_VAGAS)
+        applicants_future = executor.submit(_load_json_file, settings.DATA_PATH_APPLICANTS)
+        vagas_data, applicants_data = vagas_future.result(), applicants_future.result()
+    prospects_data = _stream_prospects(settings.DATA_PATH_PROSPECTS) # Maior arquivo: consumido em streaming dentro de _create_documents_from_data
+
+    if not (vagas_data or applicants_data or Path(settings.DATA_PATH_PROSPECTS).exists()):
         logger.error("Todos os arquivos de dados estão vazios ou não foram encontrados.")
-        # ... (lógica de fallback como antes)
-        return [], None, {}
+        _raw_docs_dict_cache = {}
+        if settings.VECTOR_BACKEND is VectorBackend.FAISS:
+            _vector_store_cache = _load_or_build_faiss([], embedding_function)
+            return [], _vector_store_cache, {}
+        try:
+            _vector_store_cache = Chroma(client=_get_chroma_client(chroma_db_path), collection_name=collection_name, embedding_function=embedding_function)
+            logger.info(f"ChromaDB (vazio ou existente) carregado de {chroma_db_path}")
+            return [], _vector_store_cache, {}
+        except Exception as e: logger.error(f"Erro ao carregar ChromaDB (sem dados): {e}", exc_info=True); return [], None, {}
 
-    all_documents_prepared, raw_docs_dict_created = _create_documents_from_data(
+    # _create_documents_from_data já descarta registros com erro: só documentos com metadados válidos seguem para o vector store
+    documents_for_chroma, raw_docs_dict_created = _create_documents_from_data(
         vagas_data, applicants_data, prospects_data
     )
     _raw_docs_dict_cache = raw_docs_dict_created # Cacheia os documentos Vaga e Candidato com metadados válidos
-    
-    # Filtra para ChromaDB apenas documentos que tiveram metadados válidos na origem
-    documents_for_chroma = [doc for doc in all_documents_prepared if doc.metadata.get("has_valid_metadata", False)]
+    _write_arrow_raw_docs(raw_docs_dict_created, raw_docs_fingerprint)
+
+    if settings.VECTOR_BACKEND is VectorBackend.FAISS:
+        try: _vector_store_cache = _load_or_build_faiss(documents_for_chroma, embedding_function)
+        except Exception as e: logger.error(f"Erro ao carregar/criar índice FAISS: {e}", exc_info=True); _vector_store_cache = None; raise
+        return documents_for_chroma, _vector_store_cache, _raw_docs_dict_cache
     
     if not documents_for_chroma:
         logger.warning("Nenhum documento com metadados válidos foi gerado para o vector store.")
-        # ... (lógica de fallback como antes)
-        return [], None, _raw_docs_dict_cache
+        try:
+            _vector_store_cache = Chroma(client=_get_chroma_client(chroma_db_path), collection_name=collection_name, embedding_function=embedding_function)
+            logger.info(f"ChromaDB carregado (sem novos docs válidos) de {chroma_db_path}")
+            return [], _vector_store_cache, _raw_docs_dict_cache
+        except Exception as e: logger.error(f"Erro ao carregar ChromaDB (sem novos docs válidos): {e}", exc_info=True); return [], None, _raw_docs_dict_cache
 
     logger.info(f"Tentando criar/carregar ChromaDB em {chroma_db_path} para a coleção {collection_name}")
     try:
-        vector_store = Chroma(collection_name=collection_name, embedding_function=embedding_function, persist_directory=chroma_db_path)
-        logger.info(f"ChromaDB carregado/criado. Documentos atuais na coleção: {vector_store._collection.count()}")
-        
-        doc_ids_generated = []
-        for i, doc in enumerate(documents_for_chroma):
-            doc_type = doc.metadata.get("type", "unknown")
-            id_str = f"error_doc_{i}" # Fallback inicial
-            if doc_type == "vaga": id_str = f"vaga_{doc.metadata.get('codigo_vaga', f'v_err_{i}')}"
-            elif doc_type == "candidato": id_str = f"candidato_{doc.metadata.get('codigo_profissional', f'c_err_{i}')}"
-            elif doc_type == "prospect":
-                idx = doc.metadata.get('prospect_identifier_index', i) 
-                v_id = doc.metadata.get('vaga_id_associada', 'NA')
-                c_id = doc.metadata.get('codigo_candidato_associado', 'NA')
-                id_str = f"prospect_{v_id}_{c_id}_{idx}"
-            else: # Documentos de erro (type="error_document") não devem chegar aqui devido ao filtro anterior
-                  # mas se chegarem, terão um ID baseado no original_id
-                original_id = doc.metadata.get('original_id', f'untyped_idx_{i}')
-                id_str = f"{doc_type}_{original_id}"
-            doc_ids_generated.append(id_str)
+        vector_store = Chroma(client=_get_chroma_client(chroma_db_path), collection_name=collection_name, embedding_function=embedding_function)
+        current_doc_count = vector_store._collection.count()
+        logger.info(f"ChromaDB carregado/criado (coleção {collection_name}). Documentos atuais na coleção: {current_doc_count}")
+        # Coleção já populada: não re-embedda a cada inicialização (reindexação exige limpar a coleção)
+        if current_doc_count > 0:
+            logger.info(f"Coleção '{collection_name}' já populada. {current_doc_count} docs existentes.")
+            _vector_store_cache = vector_store
+            return documents_for_chroma, _vector_store_cache, _raw_docs_dict_cache
         
-        if len(doc_ids_generated) != len(set(doc_ids_generated)):
-            counts = Counter(doc_ids_generated)
-            duplicates = {id_val: count for id_val, count in counts.items() if count > 1}
-            logger.error(f"ERRO CRÍTICO: IDs duplicados gerados para ChromaDB! Duplicatas: {duplicates}")
-            raise ValueError(f"IDs duplicados detectados: {duplicates}.")
+        doc_ids_generated = _generate_doc_ids(documents_for_chroma)
+        docs_to_embed, ids_to_embed, dup_docs, dup_ids, dup_first_ids = _split_duplicate_content(documents_for_chroma, doc_ids_generated)
         
-        batch_size = 200 # << REDUZA ESTE VALOR SE O ERRO DE MAX_TOKENS PERSISTIR (ex: 100, 50)
-        num_batches = (len(documents_for_chroma) + batch_size - 1) // batch_size
-        logger.info(f"Adicionando {len(documents_for_chroma)} docs ao ChromaDB em {num_batches} lotes de (até) {batch_size}.")
+        batch_size = _EMBED_BATCH_SIZE
+        num_batches = (len(docs_to_embed) + batch_size - 1) // batch_size
+        logger.info(f"Adicionando {len(docs_to_embed)} docs ao ChromaDB em {num_batches} lotes de (até) {batch_size}.")
         
-        for i in range(num_batches):
+        def _add_batch(i: int) -> int:
             batch_start = i * batch_size; batch_end = (i + 1) * batch_size
-            batch_docs_to_add = documents_for_chroma[batch_start:batch_end]
-            batch_ids_to_add = doc_ids_generated[batch_start:batch_end]
-            if not batch_docs_to_add: continue
-
+            batch_docs_to_add = docs_to_embed[batch_start:batch_end]
+            if not batch_docs_to_add: return 0
             logger.info(f"Processando lote {i+1}/{num_batches} com {len(batch_docs_to_add)} documentos...")
-            try:
-                vector_store.add_documents(documents=batch_docs_to_add, ids=batch_ids_to_add)
-                logger.info(f"Lote {i+1}/{num_batches} adicionado/atualizado com sucesso.")
-            except Exception as e_batch:
-                logger.error(f"Erro ao adicionar lote {i+1}/{num_batches} ao ChromaDB: {e_batch}", exc_info=True)
-                if hasattr(e_batch, 'response') and e_batch.response is not None:
-                    try: error_details = e_batch.response.json(); logger.error(f"Detalhes do erro API (lote): {error_details}")
-                    except: logger.error(f"Texto do erro API (lote): {e_batch.response.text}")
-                raise # Re-levanta para parar o lifespan se um lote falhar
+            vector_store.add_documents(documents=batch_docs_to_add, ids=ids_to_embed[batch_start:batch_end])
+            return len(batch_docs_to_add)
+
+        added_count = _run_embedding_batches(num_batches, _add_batch, "ChromaDB")
+        
+        # Duplicatas também são gravadas (com seus próprios IDs e metadados), com o vetor já armazenado do primeiro ID: sem chamada à API
+        for batch_start in range(0, len(dup_ids), batch_size):
+            batch_first_ids = dup_first_ids[batch_start:batch_start + batch_size]
+            stored = vector_store._collection.get(ids=list(dict.fromkeys(batch_first_ids)), include=["embeddings"])
+            vector_by_id = dict(zip(stored["ids"], stored["embeddings"]))
+            batch_docs = dup_docs[batch_start:batch_start + batch_size]
+            vector_store._collection.upsert(
+                ids=dup_ids[batch_start:batch_start + batch_size], embeddings=[vector_by_id[first_id] for first_id in batch_first_ids],
+                metadatas=[doc.metadata for doc in batch_docs], documents=[doc.page_content for doc in batch_docs],
+            )
+            added_count += len(batch_docs)
         
-        vector_store.persist() 
-        logger.info(f"Todos os lotes processados. Docs totais na coleção: {vector_store._collection.count()}. Persistência chamada.")
+        logger.info(f"Todos os lotes processados. {added_count} docs adicionados/atualizados na coleção.") # PersistentClient grava a cada add
         
     except ValueError as ve:
         logger.error(f"ValueError durante a adição de docs ao ChromaDB: {ve}", exc_info=False)
@@ -411,4 +723,5 @@ def get_vector_store() -> Optional[Chroma]:
 def get_all_documents_dict() -> Dict[str, Document]:
     global _raw_docs_dict_cache
     if not _raw_docs_dict_cache: logger.warning("Dicionário de docs brutos solicitado mas está vazio.")
-    return _raw_docs_dict_cache
\ No newline at end of file
+    return _raw_docs_dict_cache
+
@@ -1,35 +1,43 @@
 # app/main.py
-from fastapi import FastAPI, HTTPException, Depends, Query, Body
+from fastapi import FastAPI, HTTPException, Depends, Query, Body, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
 from contextlib import asynccontextmanager
+import asyncio
+import functools
+import hashlib
 import logging
 import uvicorn
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
 import os
-import json
+import orjson
+import tiktoken
 
 # Configurações do projeto
 from app.core.config import settings
 
 # Lógica de processamento de dados e carregamento
-from app.data_processing.loader import (
+from app.data_processing.loader_complete import (
     load_and_process_data,
     get_all_documents_dict
 )
 
 # Lógica do agente de IA
 from app.agent.agent_core import (
-    create_recruitment_agent_executor, get_llm, get_embeddings,
+    create_recruitment_agent_executor, get_llm, get_embeddings, ascore_applicants_for_job,
     HumanMessage, AIMessage # 'Document' foi removido daqui
 )
 # Importação CORRETA para a classe Document do LangChain
 from langchain_core.documents import Document # <--- ADICIONADO AQUI
+from langchain_core.messages import BaseMessage
 
 # Modelos Pydantic para requisições e respostas
 from app.models.pydantic_models import (
     QueryRequest, QueryResponse, JobIdRequest, JobDetailsResponse,
-    ApplicantIdRequest, ApplicantDetailsResponse, SourceDocument,
-    ListJobsResponse, JobSummary, ListApplicantsResponse, ApplicantSummary, StatusResponse
+    ApplicantIdRequest, ApplicantDetailsResponse,
+    ListJobsResponse, ListApplicantsResponse, StatusResponse,
+    MatchScoreBatchRequest, MatchScoreBatchResponse
 )
 
 # Configuração do Logging principal da aplicação
@@ -44,6 +52,61 @@ agent_executor: Optional[Any] = None
 vector_store: Optional[Any] = None
 raw_docs_dict: Dict[str, Any] = {}
 
+# Listagens pré-computadas uma vez após o carregamento (colunas paralelas): os endpoints só fatiam
+JOB_IDS: Tuple[str, ...] = (); JOB_TITLES: Tuple[str, ...] = ()
+APPLICANT_IDS: Tuple[str, ...] = (); APPLICANT_NAMES: Tuple[str, ...] = ()
+# Chaves de raw_docs_dict com metadados válidos: o 404 dos endpoints de detalhe vira uma única consulta em set
+VALID_JOB_KEYS: Set[str] = set(); VALID_APPLICANT_KEYS: Set[str] = set()
+
+def _index_raw_docs(docs: Dict[str, Any]) -> None:
+    global JOB_IDS, JOB_TITLES, APPLICANT_IDS, APPLICANT_NAMES, VALID_JOB_KEYS, VALID_APPLICANT_KEYS, LISTINGS_VERSION
+    job_ids, job_titles, applicant_ids, applicant_names = [], [], [], []; valid_job_keys, valid_applicant_keys = set(), set()
+    for k, doc in docs.items():
+        metadata = doc.metadata
+        if not metadata.get("has_valid_metadata", False): continue
+        doc_type = metadata.get("type")
+        if doc_type == "vaga": valid_job_keys.add(k); job_ids.append(metadata.get("codigo_vaga", k.replace("vaga_", ""))); job_titles.append(metadata.get("titulo_vaga", "N/A"))
+        elif doc_type == "candidato": valid_applicant_keys.add(k); applicant_ids.append(metadata.get("codigo_profissional", k.replace("candidato_", ""))); applicant_names.append(metadata.get("nome", "N/A"))
+    JOB_IDS, JOB_TITLES, APPLICANT_IDS, APPLICANT_NAMES = tuple(job_ids), tuple(job_titles), tuple(applicant_ids), tuple(applicant_names)
+    VALID_JOB_KEYS, VALID_APPLICANT_KEYS = valid_job_keys, valid_applicant_keys
+    # Versão muda a cada recarga com conteúdo diferente: invalida o cache de bytes e os ETags das listagens
+    LISTINGS_VERSION = hashlib.md5(orjson.dumps([JOB_IDS, JOB_TITLES, APPLICANT_IDS, APPLICANT_NAMES]), usedforsecurity=False).hexdigest()[:16]
+    _listing_bytes("jobs", LISTINGS_VERSION, 0, 100); _listing_bytes("applicants", LISTINGS_VERSION, 0, 100) # Página padrão do frontend
+    logger.info(f"Listagens pré-computadas: {len(JOB_IDS)} vagas, {len(APPLICANT_IDS)} candidatos (versão {LISTINGS_VERSION}).")
+
+# Listagens só mudam quando raw_docs_dict é recarregado: o JSON de cada página é serializado uma vez por versão
+# e servido como bytes, com ETag para o cliente revalidar sem receber o corpo (304)
+LISTINGS_VERSION = ""
+_LISTING_FIELDS = {"jobs": ("job_id", "title"), "applicants": ("applicant_id", "name")}
+
+@functools.lru_cache(maxsize=256)
+def _listing_bytes(kind: str, version: str, skip: int, limit: int) -> bytes:
+    ids, labels = (JOB_IDS, JOB_TITLES) if kind == "jobs" else (APPLICANT_IDS, APPLICANT_NAMES)
+    id_field, label_field = _LISTING_FIELDS[kind]
+    page = [{id_field: item_id, label_field: label} for item_id, label in zip(ids[skip : skip + limit], labels[skip : skip + limit])]
+    return orjson.dumps({kind: page, "total": len(ids)})
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match (RFC 9110): lista separada por vírgulas, comparação fraca (ignora "W/") e "*" casa com qualquer ETag."""
+    if not if_none_match: return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+def _listing_response(kind: str, skip: int, limit: int, if_none_match: Optional[str]) -> Response:
+    etag = f'"{LISTINGS_VERSION}-{skip}-{limit}"'
+    if _etag_matches(if_none_match, etag): return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=_listing_bytes(kind, LISTINGS_VERSION, skip, limit), media_type="application/json", headers={"ETag": etag})
+
+async def _warmup(llm_instance: Any) -> None:
+    """Consulta descartável ao retriever (embedding + páginas do índice) e ao LLM para tirar o cold start da 1ª query."""
+    started = asyncio.get_running_loop().time()
+    tasks = [llm_instance.ainvoke("ping", max_tokens=1)]
+    if vector_store: tasks.append(vector_store.as_retriever().ainvoke("warmup"))
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception): logger.warning(f"LIFESPAN: Falha no aquecimento (ignorada): {type(result).__name__} - {result}")
+    logger.info(f"LIFESPAN: Aquecimento de LLM/retriever concluído em {asyncio.get_running_loop().time() - started:.2f}s.")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global agent_executor, vector_store, raw_docs_dict
@@ -60,22 +123,23 @@ async def lifespan(app: FastAPI):
     logger.info(f"ChromaDB Path (settings): {settings.CHROMA_DB_PATH}, Coleção: {settings.CHROMA_COLLECTION_NAME}")
 
     try:
-        logger.info("LIFESPAN: Pré-inicializando embeddings...")
-        embedding_function = get_embeddings()
+        # Inicializações independentes em paralelo (threads): embeddings, LLM e encoder tiktoken do histórico
+        logger.info("LIFESPAN: Pré-inicializando embeddings, LLM e encoder de tokens...")
+        embedding_function, llm_instance, _ = await asyncio.gather(asyncio.to_thread(get_embeddings), asyncio.to_thread(get_llm), asyncio.to_thread(_get_history_encoder))
         logger.info(f"LIFESPAN: Embeddings inicializados (tipo: {type(embedding_function)}).")
-
-        logger.info("LIFESPAN: Pré-inicializando LLM...")
-        llm_instance = get_llm()
         logger.info(f"LIFESPAN: LLM inicializado (tipo: {type(llm_instance)}).")
 
         logger.info("LIFESPAN: Chamando load_and_process_data...")
-        processed_docs_list, vector_store_instance, all_loaded_raw_docs_dict = load_and_process_data(
+        # Em thread para não bloquear o event loop durante a carga (JSON, Chroma e embeddings)
+        processed_docs_list, vector_store_instance, all_loaded_raw_docs_dict = await asyncio.to_thread(
+            load_and_process_data,
             chroma_db_path=settings.CHROMA_DB_PATH,
             collection_name=settings.CHROMA_COLLECTION_NAME,
             embedding_function=embedding_function
         )
         vector_store = vector_store_instance
         raw_docs_dict = all_loaded_raw_docs_dict
+        _index_raw_docs(raw_docs_dict)
         logger.info(f"LIFESPAN: load_and_process_data concluído. {len(processed_docs_list)} docs para store. {len(raw_docs_dict)} docs no raw_dict.")
 
         if vector_store:
@@ -92,6 +156,8 @@ async def lifespan(app: FastAPI):
             if agent_executor: logger.info("LIFESPAN: Agente inicializado SEM ferramenta de busca.")
             else: logger.error("LIFESPAN: Falha ao inicializar agente (executor None), mesmo sem retriever.")
 
+        if agent_executor: await _warmup(llm_instance)
+
     except ValueError as ve:
         logger.critical(f"LIFESPAN CRÍTICO - ValueError na inicialização: {ve}", exc_info=False)
     except Exception as e:
@@ -115,17 +181,77 @@ if settings.CORS_ORIGINS:
     logger.info(f"Configurando CORS para as seguintes origens: {settings.CORS_ORIGINS}")
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=[str(origin).strip() for origin in settings.CORS_ORIGINS],
+        # frozenset: o Starlette aceita qualquer Collection e testa `origin in allow_origins` a cada requisição (O(1))
+        allow_origins=frozenset(str(origin).strip().lower() for origin in settings.CORS_ORIGINS),
         allow_credentials=True, allow_methods=["*"], allow_headers=["*"],
     )
 else: logger.warning("CORS_ORIGINS não configurado.")
 
+# Respostas >= 1 KB (ex.: sources do /query_agent) comprimidas com gzip; o Starlette não comprime text/event-stream,
+# então o streaming SSE continua sendo entregue evento a evento
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 API_PREFIX = settings.API_V1_STR
 
 @app.get("/", tags=["Root"], response_model=StatusResponse)
 async def read_root():
     return StatusResponse(status="ok", message=f"{settings.PROJECT_NAME} Backend is running!")
 
+# Classe de mensagem por "type" do histórico; qualquer outro tipo é tratado como resposta da IA
+_MSG_CLS = {"human": HumanMessage, "user": HumanMessage, "ai": AIMessage, "assistant": AIMessage}
+
+# Histórico de chat cortado no servidor por orçamento de tokens (mensagens mais recentes primeiro). O corte para ao
+# estourar o orçamento, então o custo de tokenização é limitado a ~HISTORY_TOKEN_BUDGET tokens por requisição
+HISTORY_TOKEN_BUDGET = 1500
+
+# Carregado no lifespan (em thread): o tiktoken baixa o arquivo BPE na primeira carga, o que não pode ocorrer no event loop
+@functools.lru_cache(maxsize=1)
+def _get_history_encoder() -> Optional[tiktoken.Encoding]:
+    try:
+        try: return tiktoken.encoding_for_model(settings.LLM_MODEL_NAME)
+        except KeyError: return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"Encoder tiktoken indisponível ({e}); contagem de tokens do histórico será estimada (~4 caracteres/token)."); return None
+
+def _trim_history(chat_history: List[Dict[str, str]]) -> List[BaseMessage]:
+    encoder = _get_history_encoder(); remaining = HISTORY_TOKEN_BUDGET; kept: List[BaseMessage] = []
+    for msg in reversed(chat_history):
+        content = msg.get("content", "")
+        remaining -= len(encoder.encode(content, disallowed_special=())) if encoder else len(content) // 4 + 1
+        if remaining < 0: break
+        kept.append(_MSG_CLS.get(msg.get("type"), AIMessage)(content=content))
+    kept.reverse(); return kept
+
+def _build_agent_input(request: QueryRequest) -> Dict[str, Any]:
+    agent_input: Dict[str, Any] = {"input": request.query}
+    if request.chat_history:
+        formatted_history = _trim_history(request.chat_history)
+        if formatted_history: agent_input["chat_history"] = formatted_history
+        logger.info(f"Histórico de chat com {len(formatted_history)} de {len(request.chat_history)} mensagens incluído (limite de {HISTORY_TOKEN_BUDGET} tokens).")
+    return agent_input
+
+# Limite de chamadas simultâneas ao LLM por worker: rajadas ficam na fila em vez de gerar uma avalanche de 429 na OpenAI.
+# Criado sob demanda dentro do event loop em execução (em Python 3.9 o Semaphore se prende ao loop da criação).
+_llm_semaphore: Optional[asyncio.Semaphore] = None
+
+def _get_llm_semaphore() -> asyncio.Semaphore:
+    global _llm_semaphore
+    if _llm_semaphore is None: _llm_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_LLM)
+    return _llm_semaphore
+
+def _extract_sources(step_action: Any, step_observation: Any) -> List[Dict[str, Any]]:
+    """Fontes (dicts no formato de SourceDocument) de um passo intermediário do agente."""
+    observation_type = type(step_observation) # Comparação exata de tipo: mais barata que isinstance no caminho quente
+    if observation_type is list and all(isinstance(doc_obj, Document) for doc_obj in step_observation):
+        return [{"page_content": doc_obj.page_content, "metadata": doc_obj.metadata} for doc_obj in step_observation]
+    if observation_type is str:
+        return [{"page_content": step_observation, "metadata": {"source_tool": getattr(step_action, "tool", "unknown_tool"), "tool_input": getattr(step_action, "tool_input", {})}}]
+    return []
+
+def _collect_sources(intermediate_steps: Optional[List[Any]]) -> List[Dict[str, Any]]:
+    return [source for step in intermediate_steps or () for source in _extract_sources(*step)]
+
+# Resposta montada como dict: o FastAPI valida e serializa direto para bytes JSON via Pydantic (response_model)
 @app.post(f"{API_PREFIX}/query_agent", response_model=QueryResponse, tags=["Agent"])
 async def query_agent_endpoint(request: QueryRequest = Body(...)):
     if not agent_executor:
@@ -133,66 +259,108 @@ async def query_agent_endpoint(request: QueryRequest = Body(...)):
         raise HTTPException(status_code=503, detail="Agente de IA não disponível.")
     
     logger.info(f"Query para agente: '{request.query}' (Sessão: {request.session_id})")
-    agent_input = {"input": request.query}
-    if request.chat_history:
-        formatted_history = [HumanMessage(content=msg["content"]) if msg.get("type") == "human" else AIMessage(content=msg.get("content", "")) for msg in request.chat_history]
-        if formatted_history: agent_input["chat_history"] = formatted_history
-        logger.info(f"Histórico de chat com {len(formatted_history)} mensagens incluído.")
+    agent_input = _build_agent_input(request)
 
     try:
         logger.info(f"Endpoint /query_agent: Invocando agent_executor.ainvoke com input: '{agent_input.get('input')}'")
-        response_dict = await agent_executor.ainvoke(agent_input)
+        async with _get_llm_semaphore(): response_dict = await agent_executor.ainvoke(agent_input)
         answer = response_dict.get("output", "Sem 'output' padrão do agente.")
-        sources_data: List[SourceDocument] = []
-        if "intermediate_steps" in response_dict and response_dict["intermediate_steps"]:
-            for step_action, step_observation in response_dict["intermediate_steps"]:
-                if isinstance(step_observation, list) and all(isinstance(doc_obj, Document) for doc_obj in step_observation):
-                    for doc_obj_item in step_observation: sources_data.append(SourceDocument(page_content=doc_obj_item.page_content, metadata=doc_obj_item.metadata))
-                elif isinstance(step_observation, str):
-                    tool_name = step_action.tool if hasattr(step_action, 'tool') else "unknown_tool"
-                    tool_input = step_action.tool_input if hasattr(step_action, 'tool_input') else {}
-                    sources_data.append(SourceDocument(page_content=step_observation, metadata={"source_tool": tool_name, "tool_input": tool_input}))
+        sources_data = _collect_sources(response_dict.get("intermediate_steps"))
         logger.info(f"Resposta do agente: {answer[:200]}... ({len(sources_data)} fontes)")
-        return QueryResponse(answer=answer, sources=sources_data, session_id=request.session_id)
+        return {"answer": answer, "sources": sources_data, "session_id": request.session_id}
 
     except Exception as e:
         logger.error(f"Erro DURANTE agent_executor.ainvoke: {type(e).__name__} - {e}", exc_info=True)
         error_message_to_client = f"Erro interno ao processar a query com o agente."
-        if hasattr(e, 'response') and e.response is not None:
+        if getattr(e, "response", None) is not None:
             try:
-                error_details = e.response.json() 
-                logger.error(f"Detalhes do erro da API OpenAI (JSON): {error_details}")
-                api_error_message = error_details.get("error", {}).get("message", "")
-                if api_error_message: error_message_to_client = f"Erro da API OpenAI: {api_error_message}"
-            except json.JSONDecodeError: 
+                raw_body = e.response.content or b"" # Corpo lido uma única vez; parse único com orjson
                 try:
-                    error_text = e.response.text 
+                    error_details = orjson.loads(raw_body)
+                    logger.error(f"Detalhes do erro da API OpenAI (JSON): {error_details}")
+                    api_error_message = (error_details.get("error") or {}).get("message", "") if type(error_details) is dict else ""
+                    if api_error_message: error_message_to_client = f"Erro da API OpenAI: {api_error_message}"
+                except orjson.JSONDecodeError:
+                    error_text = raw_body[:200].decode("utf-8", "replace")
                     logger.error(f"Detalhes do erro da API OpenAI (Texto): {error_text}")
-                    if error_text: error_message_to_client = f"Erro da API OpenAI (texto): {error_text[:200]}"
-                except Exception as e_text: logger.error(f"Não foi possível ler o texto da resposta do erro da API: {e_text}")
-            except Exception as e_resp_json: logger.error(f"Erro ao processar e.response.json(): {e_resp_json}")
+                    if error_text: error_message_to_client = f"Erro da API OpenAI (texto): {error_text}"
+            except Exception as e_resp: logger.error(f"Não foi possível ler a resposta do erro da API: {e_resp}")
         elif isinstance(e, ValueError) and "OPENAI_API_KEY" in str(e):
              error_message_to_client = "Erro de configuração da API Key. Contate o administrador."
         raise HTTPException(status_code=500, detail=error_message_to_client)
 
-@app.get(f"{API_PREFIX}/jobs", response_model=ListJobsResponse, tags=["Data Access"])
-async def list_jobs_endpoint(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
-    global raw_docs_dict
-    if not raw_docs_dict: return ListJobsResponse(jobs=[], total=0) 
-    job_summaries: List[JobSummary] = [
-        JobSummary(
-            job_id=doc.metadata.get("codigo_vaga", k.replace("vaga_", "")),
-            title=doc.metadata.get("titulo_vaga", "N/A")
-        ) for k, doc in raw_docs_dict.items() if doc.metadata.get("type") == "vaga" and doc.metadata.get("has_valid_metadata", False)
-    ]
-    total_jobs = len(job_summaries); paginated_jobs = job_summaries[skip : skip + limit]
-    logger.info(f"Listando vagas: {len(paginated_jobs)} de {total_jobs}")
-    return ListJobsResponse(jobs=paginated_jobs, total=total_jobs)
+# Janela de agrupamento dos tokens no streaming: evita enviar um evento SSE por token
+STREAM_FLUSH_INTERVAL_S = 0.05
+
+def _sse(payload: Dict[str, Any]) -> bytes:
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+# Server-Sent Events: {"token": ...} a cada janela, {"done": true, "answer": ..., "sources": [...], "session_id": ...} ao final
+# ou {"error": ...} em falha (o status HTTP já foi enviado). "answer" é o output do AgentExecutor e substitui os tokens parciais
+# (cobre max_iterations e handle_parsing_errors, cujo texto final não vem de um token do LLM)
+@app.post(f"{API_PREFIX}/query_agent/stream", tags=["Agent"])
+async def query_agent_stream_endpoint(request: QueryRequest = Body(...)):
+    if not agent_executor:
+        logger.error("Endpoint /query_agent/stream: Agente não inicializado.")
+        raise HTTPException(status_code=503, detail="Agente de IA não disponível.")
+
+    logger.info(f"Query (stream) para agente: '{request.query}' (Sessão: {request.session_id})")
+    agent_input = _build_agent_input(request)
+
+    async def event_stream():
+        loop = asyncio.get_running_loop()
+        buffer: List[str] = []; last_flush = loop.time(); sources_data: List[Dict[str, Any]] = []; tool_call_runs: Set[str] = set()
+        answer = "Sem 'output' padrão do agente."
+        try:
+            async with _get_llm_semaphore():
+                async for event in agent_executor.astream_events(agent_input, version="v2"):
+                    kind = event["event"]
+                    if kind == "on_chat_model_stream":
+                        chunk = event["data"]["chunk"]; run_id = event["run_id"]
+                        # Turno de chamada de ferramenta (ex.: "Vou buscar..." + tool_calls) não faz parte da resposta: o run é ignorado
+                        # a partir do primeiro tool_call_chunk, descartando o que ainda não foi enviado (os runs do agente são sequenciais)
+                        if getattr(chunk, "tool_call_chunks", None) and run_id not in tool_call_runs: tool_call_runs.add(run_id); buffer.clear()
+                        if run_id in tool_call_runs: continue
+                        if chunk.content: buffer.append(chunk.content)
+                        if buffer and loop.time() - last_flush >= STREAM_FLUSH_INTERVAL_S:
+                            yield _sse({"token": "".join(buffer)}); buffer.clear(); last_flush = loop.time()
+                    elif kind == "on_chain_end" and not event.get("parent_ids"): # Fim do AgentExecutor (run raiz)
+                        output = event["data"].get("output")
+                        if isinstance(output, dict): answer = output.get("output", answer); sources_data = _collect_sources(output.get("intermediate_steps"))
+            if buffer: yield _sse({"token": "".join(buffer)})
+            yield _sse({"done": True, "answer": answer, "sources": sources_data, "session_id": request.session_id})
+        except Exception as e:
+            logger.error(f"Erro DURANTE agent_executor.astream_events: {type(e).__name__} - {e}", exc_info=True)
+            yield _sse({"error": "Erro interno ao processar a query com o agente."})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post(f"{API_PREFIX}/match_score/batch", response_model=MatchScoreBatchResponse, tags=["Agent"])
+async def match_score_batch_endpoint(request: MatchScoreBatchRequest = Body(...)):
+    job_key = f"vaga_{request.job_id}"
+    if job_key not in VALID_JOB_KEYS:
+        raise HTTPException(status_code=404, detail=f"Vaga ID {request.job_id} não encontrada ou inválida.")
+    applicant_keys = {applicant_id: f"candidato_{applicant_id}" for applicant_id in dict.fromkeys(request.applicant_ids)} # Remove duplicados mantendo a ordem
+    missing_ids = [applicant_id for applicant_id, doc_key in applicant_keys.items() if doc_key not in VALID_APPLICANT_KEYS]
+    if missing_ids:
+        raise HTTPException(status_code=404, detail=f"Candidato(s) não encontrado(s) ou inválido(s): {', '.join(missing_ids)}.")
+    applicants = {applicant_id: raw_docs_dict[doc_key].page_content for applicant_id, doc_key in applicant_keys.items()}
+    logger.info(f"Match em lote: vaga {request.job_id} vs {len(applicants)} candidatos (top_k={request.top_k})")
+    try:
+        async with _get_llm_semaphore(): return await ascore_applicants_for_job(get_llm(), get_embeddings(), request.job_id, raw_docs_dict[job_key].page_content, applicants, request.top_k)
+    except Exception as e:
+        logger.error(f"Erro no match em lote para vaga {request.job_id}: {type(e).__name__} - {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Erro interno ao calcular o match em lote.")
+
+@app.get(f"{API_PREFIX}/jobs", response_model=None, responses={200: {"model": ListJobsResponse}}, tags=["Data Access"])
+async def list_jobs_endpoint(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000), if_none_match: Optional[str] = Header(None)):
+    logger.info(f"Listando vagas: skip={skip}, limit={limit} de {len(JOB_IDS)}")
+    return _listing_response("jobs", skip, limit, if_none_match)
 
 @app.post(f"{API_PREFIX}/job_details", response_model=JobDetailsResponse, tags=["Data Access"])
 async def get_job_details_endpoint(request: JobIdRequest = Body(...)):
     global raw_docs_dict; doc_key = f"vaga_{str(request.job_id)}"
-    if doc_key not in raw_docs_dict or not raw_docs_dict[doc_key].metadata.get("has_valid_metadata", False):
+    if doc_key not in VALID_JOB_KEYS:
         raise HTTPException(status_code=404, detail=f"Vaga ID {request.job_id} não encontrada ou inválida.")
     job_doc = raw_docs_dict[doc_key]; metadata = job_doc.metadata; logger.info(f"Detalhes para vaga ID: {request.job_id}")
     return JobDetailsResponse(
@@ -207,24 +375,15 @@ async def get_job_details_endpoint(request: JobIdRequest = Body(...)):
         competencias_tecnicas_flat=metadata.get("competencias_tecnicas")
     )
 
-@app.get(f"{API_PREFIX}/applicants", response_model=ListApplicantsResponse, tags=["Data Access"])
-async def list_applicants_endpoint(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
-    global raw_docs_dict
-    if not raw_docs_dict: return ListApplicantsResponse(applicants=[], total=0)
-    applicant_summaries: List[ApplicantSummary] = [
-        ApplicantSummary(
-            applicant_id=doc.metadata.get("codigo_profissional", k.replace("candidato_", "")),
-            name=doc.metadata.get("nome", "N/A")
-        ) for k, doc in raw_docs_dict.items() if doc.metadata.get("type") == "candidato" and doc.metadata.get("has_valid_metadata", False)
-    ]
-    total_applicants = len(applicant_summaries); paginated_applicants = applicant_summaries[skip : skip + limit]
-    logger.info(f"Listando candidatos: {len(paginated_applicants)} de {total_applicants}")
-    return ListApplicantsResponse(applicants=paginated_applicants, total=total_applicants)
+@app.get(f"{API_PREFIX}/applicants", response_model=None, responses={200: {"model": ListApplicantsResponse}}, tags=["Data Access"])
+async def list_applicants_endpoint(skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000), if_none_match: Optional[str] = Header(None)):
+    logger.info(f"Listando candidatos: skip={skip}, limit={limit} de {len(APPLICANT_IDS)}")
+    return _listing_response("applicants", skip, limit, if_none_match)
 
 @app.post(f"{API_PREFIX}/applicant_details", response_model=ApplicantDetailsResponse, tags=["Data Access"])
 async def get_applicant_details_endpoint(request: ApplicantIdRequest = Body(...)):
     global raw_docs_dict; doc_key = f"candidato_{str(request.applicant_id)}"
-    if doc_key not in raw_docs_dict or not raw_docs_dict[doc_key].metadata.get("has_valid_metadata", False):
+    if doc_key not in VALID_APPLICANT_KEYS:
         raise HTTPException(status_code=404, detail=f"Candidato ID {request.applicant_id} não encontrado ou inválido.")
     applicant_doc = raw_docs_dict[doc_key]; metadata = applicant_doc.metadata; logger.info(f"Detalhes para candidato ID: {request.applicant_id}")
     return ApplicantDetailsResponse(
@@ -238,5 +397,10 @@ async def get_applicant_details_endpoint(request: ApplicantIdRequest = Body(...)
     )
 
 if __name__ == "__main__":
-    logger.info("Rodando FastAPI com Uvicorn diretamente para desenvolvimento local (main.py)...")
-    uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True, lifespan="on", log_level="info")
\ No newline at end of file
+    # Um processo por padrão: cada worker executa seu próprio lifespan (carga dos docs, vector store em memória e aquecimento).
+    # WEB_CONCURRENCY > 1 é seguro (a ingestão é serializada por lock de arquivo), mas multiplica a memória.
+    # Para desenvolvimento com auto-reload use: uvicorn app.main:app --reload
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    logger.info(f"Rodando FastAPI com Uvicorn diretamente (main.py): {workers} workers, uvloop + httptools...")
+    # limit_concurrency: acima de N conexões simultâneas por worker o uvicorn responde 503 (backpressure)
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, loop="uvloop", http="httptools", workers=workers, limit_concurrency=int(os.getenv("UVICORN_LIMIT_CONCURRENCY", "64")), lifespan="on", log_level="info")
\ No newline at end of file
@@ -95,4 +95,13 @@ class MatchScoreResponse(BaseModel):
     score: int = Field(..., ge=0, le=100, description="Pontuação de match de 0 a 100.")
     justification: str = Field(..., description="Justificativa para a pontuação de match.")
     # matched_skills: Optional[List[str]] = None
-    # missing_skills: Optional[List[str]] = None
\ No newline at end of file
+    # missing_skills: Optional[List[str]] = None
+
+class MatchScoreBatchRequest(BaseModel):
+    job_id: str = Field(..., description="O ID único da vaga.")
+    applicant_ids: List[str] = Field(..., min_length=1, max_length=200, description="IDs dos candidatos a pontuar contra a vaga.")
+    top_k: int = Field(5, ge=1, le=20, description="Quantos candidatos (os mais similares à vaga) são avaliados pelo LLM.")
+
+class MatchScoreBatchResponse(BaseModel):
+    job_id: str
+    results: List[MatchScoreResponse] = Field(default_factory=list, description="Avaliações dos top_k candidatos, da maior para a menor pontuação.")
\ No newline at end of file
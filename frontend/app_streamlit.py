@@ -1,8 +1,10 @@
 # frontend/app_streamlit.py
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import os
-from typing import List, Dict, Optional, Any
+import json
+from typing import Callable, List, Dict, Optional, Any
 
 st.set_page_config(page_title="IntelligentMatch AI", layout="wide", initial_sidebar_state="expanded")
 
@@ -18,16 +20,35 @@ st.markdown("""
 FASTAPI_BASE_URL = os.getenv("FASTAPI_URL", "http://localhost:8000") 
 API_PREFIX = "/api/v1" 
 AGENT_QUERY_ENDPOINT = f"{FASTAPI_BASE_URL}{API_PREFIX}/query_agent"
+AGENT_STREAM_ENDPOINT = f"{AGENT_QUERY_ENDPOINT}/stream"
 
-def query_backend_agent(query: str, chat_history: Optional[List[Dict[str, str]]] = None) -> Optional[Dict[str, Any]]:
+@st.cache_resource
+def _get_http_session() -> requests.Session:
+    """Sessão HTTP compartilhada entre reruns do Streamlit: reaproveita conexões (keep-alive) com o backend."""
+    session = requests.Session(); adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount("http://", adapter); session.mount("https://", adapter)
+    return session
+
+def query_backend_agent(query: str, chat_history: Optional[List[Dict[str, str]]] = None, on_token: Optional[Callable[[str], None]] = None) -> Optional[Dict[str, Any]]:
+    """Consome o endpoint SSE do agente repassando o texto parcial a on_token; retorna answer/sources do evento final."""
     payload: Dict[str, Any] = {"query": query}
     if chat_history: payload["chat_history"] = chat_history
     
     try:
-        # st.write(f"DEBUG: Enviando para {AGENT_QUERY_ENDPOINT} com payload: {payload}")
-        response = requests.post(AGENT_QUERY_ENDPOINT, json=payload, timeout=180) 
-        response.raise_for_status() 
-        return response.json()
+        answer_parts: List[str] = []
+        with _get_http_session().post(AGENT_STREAM_ENDPOINT, json=payload, stream=True, timeout=180) as response:
+            response.raise_for_status()
+            # chunk_size=None: entrega cada evento assim que chega, sem esperar encher um bloco
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line or not line.startswith("data: "): continue
+                event = json.loads(line[6:])
+                if "token" in event:
+                    answer_parts.append(event["token"])
+                    if on_token: on_token("".join(answer_parts))
+                elif "error" in event: st.error(f"⚠️ {event['error']}"); return None
+                # A resposta final do agente (evento done) substitui os tokens parciais na tela e no histórico
+                elif event.get("done"): return {"answer": event.get("answer") or "".join(answer_parts), "sources": event.get("sources", [])}
+        st.error("⚠️ Resposta do backend interrompida antes do fim.")
     except requests.exceptions.ConnectionError as e:
         st.error(f"⚠️ Erro de conexão com o backend: {e}.")
     except requests.exceptions.Timeout:
@@ -62,8 +83,8 @@ if user_prompt := st.chat_input("Faça uma pergunta ou dê um comando..."):
     with st.chat_message("assistant"):
         thinking_message = st.empty()
         thinking_message.markdown("<p class='thinking-placeholder'>IntelliMatch AI está processando...</p>", unsafe_allow_html=True)
-        history_for_agent_payload = [{"type": msg["role"], "content": msg["content"]} for msg in st.session_state.agent_chat_history[-6:]]
-        backend_response_data = query_backend_agent(user_prompt, chat_history=history_for_agent_payload)
+        history_for_agent_payload = [{"type": msg["role"], "content": msg["content"]} for msg in st.session_state.agent_chat_history] # O backend corta por tokens
+        backend_response_data = query_backend_agent(user_prompt, chat_history=history_for_agent_payload, on_token=lambda partial_text: thinking_message.markdown(partial_text + " ▌"))
         assistant_response_text = "Desculpe, não consegui processar."; sources_markdown = ""
         if backend_response_data and "answer" in backend_response_data:
             assistant_response_text = backend_response_data["answer"]